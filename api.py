@@ -0,0 +1,191 @@
+"""
+API HTTP asynchrone de DocumentMind
+
+Expose l'ingestion et les questions-réponses sans Streamlit, pour les
+traitements batch et les tests de charge. Les index et les conversations
+sont persistés sur disque, l'API peut donc tourner avec plusieurs workers :
+
+    uvicorn api:app --workers 4
+"""
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, UploadFile, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from utils.config import Config
+from utils.chat_manager import ChatManager
+from utils.reranker import Reranker
+from utils.service import AssistantService
+from utils.scheduler import scheduler
+
+app = FastAPI(title="DocumentMind API")
+
+
+@app.on_event("startup")
+async def warm_up_reranker():
+    # Le modèle du cross-encoder est chargé au démarrage, pas pendant la première question
+    if Config.RERANK_ENABLED:
+        await run_in_threadpool(Reranker.warm_up)
+
+
+@app.on_event("startup")
+async def cleanup_uploads():
+    # Sessions d'upload abandonnées (aussi nettoyées à chaque nouvelle session)
+    await run_in_threadpool(AssistantService.cleanup_uploads)
+
+
+class ConversationCreate(BaseModel):
+    title: str | None = None
+
+
+class Question(BaseModel):
+    question: str
+
+
+class UploadCreate(BaseModel):
+    filename: str
+    size: int
+
+
+async def _get_conversation(conv_id):
+    try:
+        return await run_in_threadpool(AssistantService.get_conversation, conv_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/conversations")
+async def list_conversations():
+    return await run_in_threadpool(AssistantService.list_conversations)
+
+
+@app.post("/conversations", status_code=201)
+async def create_conversation(payload: ConversationCreate):
+    conv_id, conv = await run_in_threadpool(AssistantService.create_conversation, payload.title)
+    return {"id": conv_id, "title": conv["title"]}
+
+
+@app.get("/conversations/{conv_id}/messages")
+async def get_messages(conv_id: str):
+    conv = await _get_conversation(conv_id)
+    return conv["messages"]
+
+
+def _schedule_ingestion(background_tasks, doc, conv_id):
+    """Planifie l'indexation, sauf si le contenu est déjà indexé"""
+    status = AssistantService.get_status(doc["id"])
+    if status["status"] != "ready":
+        # L'indexation (extraction + embeddings) se poursuit après la réponse
+        background_tasks.add_task(AssistantService.ingest, doc["id"], doc["file_path"], conv_id)
+    return {**doc, "status": status["status"]}
+
+
+@app.post("/conversations/{conv_id}/documents", status_code=202)
+async def upload_document(conv_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    await _get_conversation(conv_id)
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=415, detail="Seuls les fichiers PDF sont acceptés")
+
+    try:
+        doc = await run_in_threadpool(AssistantService.add_document, conv_id, file.filename, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return _schedule_ingestion(background_tasks, doc, conv_id)
+
+
+@app.post("/conversations/{conv_id}/uploads", status_code=201)
+async def start_upload(conv_id: str, payload: UploadCreate):
+    """Ouvre un upload reprenable, envoyé ensuite par morceaux"""
+    if not payload.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=415, detail="Seuls les fichiers PDF sont acceptés")
+    try:
+        return await run_in_threadpool(AssistantService.start_upload, conv_id, payload.filename, payload.size)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Position de reprise d'un upload interrompu"""
+    try:
+        return await run_in_threadpool(AssistantService.get_upload, upload_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, upload_offset: int = Header(...)):
+    """Ajoute un morceau (corps brut) à la position indiquée par l'en-tête Upload-Offset"""
+    try:
+        writer = await run_in_threadpool(AssistantService.open_upload, upload_id, upload_offset)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        # Le corps est écrit au fil de sa réception, sans être mis en mémoire
+        async for chunk in request.stream():
+            await run_in_threadpool(writer.write, chunk)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        writer.close()
+    return await run_in_threadpool(AssistantService.get_upload, upload_id)
+
+
+@app.post("/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(upload_id: str, background_tasks: BackgroundTasks):
+    try:
+        upload = await run_in_threadpool(AssistantService.get_upload, upload_id)
+        doc = await run_in_threadpool(AssistantService.complete_upload, upload_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _schedule_ingestion(background_tasks, doc, upload["conversation_id"])
+
+
+@app.get("/documents/{doc_id}/status")
+async def get_document_status(doc_id: str):
+    return await run_in_threadpool(AssistantService.get_status, doc_id)
+
+
+@app.get("/scheduler")
+async def scheduler_stats():
+    """Profondeur des files d'attente et temps d'attente des appels OpenAI"""
+    return await run_in_threadpool(scheduler.stats)
+
+
+@app.get("/search")
+async def search(q: str, limit: int = Query(20, le=100)):
+    """Recherche globale dans tous les documents et tous les messages"""
+    return await run_in_threadpool(AssistantService.search, q, limit)
+
+
+@app.post("/conversations/{conv_id}/query")
+async def query(conv_id: str, payload: Question):
+    await _get_conversation(conv_id)
+    return await run_in_threadpool(AssistantService.ask, conv_id, payload.question)
+
+
+@app.post("/conversations/{conv_id}/query/stream")
+async def query_stream(conv_id: str, payload: Question):
+    """Réponse diffusée au fil de l'eau (text/event-stream)"""
+    await _get_conversation(conv_id)
+    await run_in_threadpool(AssistantService.append_message, conv_id, "user", payload.question)
+    vector_store = await run_in_threadpool(AssistantService.get_vector_store, conv_id)
+
+    async def events():
+        tokens = []
+        async for token in ChatManager.astream_response(payload.question, vector_store, session_id=conv_id):
+            tokens.append(token)
+            # Une donnée SSE ne peut pas contenir de saut de ligne brut
+            for line in token.split("\n"):
+                yield f"data: {line}\n"
+            yield "\n"
+        await run_in_threadpool(AssistantService.append_message, conv_id, "ai", "".join(tokens))
+        yield "event: end\ndata: \n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
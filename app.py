@@ -1,9 +1,9 @@
-from datetime import datetime
 import streamlit as st
-import os
 from utils.ui import UI
-from utils.pdf_processor import PDFProcessor
+from utils.config import Config
+from utils.models import Message
 from utils.chat_manager import ChatManager
+from utils.service import AssistantService
 from utils.storage import ConversationStorage
 
 
@@ -21,52 +21,54 @@ def handle_file_uploads(uploaded_files):
             continue
             
         try:
-            # Lire le contenu du fichier une seule fois
-            file_bytes = file.getvalue()
-            file_size = len(file_bytes)
-            
             # Vérifier si le document existe déjà
             if any(doc["name"] == file.name for doc in current_conv["documents"]):
                 st.warning(f"{file.name} existe déjà")
                 continue
+            
+            # Refuser les fichiers trop volumineux avant toute écriture
+            if file.size > Config.MAX_FILE_SIZE:
+                st.error(f"{file.name} dépasse la taille maximale ({Config.MAX_FILE_SIZE // 1_000_000} Mo)")
+                continue
                 
             with st.spinner(f"Traitement de {file.name}..."):
-                # Sauvegarder temporairement
-                os.makedirs("temp_pdfs", exist_ok=True)
-                file_path = os.path.join("temp_pdfs", file.name)
+                # Écriture par blocs avec calcul du hash, rattachement à la conversation partagée
+                file.seek(0)
+                doc = AssistantService.add_document(st.session_state.current_conversation, file.name, file)
                 
-                with open(file_path, "wb") as f:
-                    f.write(file_bytes)
+                if any(d.get("id") == doc["id"] for d in current_conv["documents"]):
+                    st.warning(f"{file.name} existe déjà sous un autre nom")
+                    continue
                 
-                # Traiter le PDF
-                new_vector_store = PDFProcessor.process_pdf(file_path)
+                # Document déjà connu : l'index persisté est réutilisé sans retraitement
+                status = AssistantService.ingest(doc["id"], doc["file_path"], session_id=st.session_state.session_id)
                 
-                if new_vector_store:
-                    # Mettre à jour le vector store
-                    if current_conv["vector_store"]:
-                        current_conv["vector_store"].merge_from(new_vector_store)
-                    else:
-                        current_conv["vector_store"] = new_vector_store
+                if status["status"] in ("ready", "processing"):
+                    current_conv["documents"].append(doc)
                     
-                    # Enregistrer les métadonnées
-                    current_conv["documents"].append({
-                        "name": file.name,
-                        "size": file_size,
-                        "uploaded_at": datetime.now().isoformat(),
-                        "file_path": file_path
-                    })
+                    # Mettre à jour le vector store à partir des index persistés
+                    current_conv["vector_store"] = AssistantService.documents_vector_store(
+                        current_conv["documents"], st.session_state.current_conversation
+                    )
                     
-                    st.success(f"✅ {file.name} prêt à l'utilisation")
-                    ConversationStorage.save_conversations()
+                    if status["status"] == "ready":
+                        st.success(f"✅ {file.name} prêt à l'utilisation")
+                    else:
+                        # Même contenu en cours d'indexation par un autre processus (API, autre session)
+                        st.info(f"⏳ {file.name} est en cours de traitement, il sera utilisé dès qu'il sera prêt")
                 else:
-                    st.error(f"Échec du traitement pour {file.name}")
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                    # Le fichier, s'il n'est plus référencé, est retiré par cleanup_old_files
+                    AssistantService.detach_document(st.session_state.current_conversation, doc["id"])
+                    st.error(f"Échec du traitement pour {file.name}: {status.get('error', status['status'])}")
                         
         except Exception as e:
             st.error(f"Erreur avec {file.name}: {str(e)}")
-            if 'file_path' in locals() and os.path.exists(file_path):
-                os.remove(file_path)
+
+
+def add_message(conv, role, content):
+    """Ajoute un message à la conversation partagée (fichier et index de recherche globale)"""
+    message = AssistantService.append_message(st.session_state.current_conversation, role, content)
+    conv["messages"].append(Message.from_dict(message))
 
                 
 def handle_user_message(user_input):
@@ -77,28 +79,18 @@ def handle_user_message(user_input):
     current_conv = st.session_state.conversations[st.session_state.current_conversation]
     
     # Ajouter le message utilisateur
-    current_conv["messages"].append({
-        "role": "user",
-        "content": user_input,
-        "timestamp": datetime.now().isoformat()
-    })
+    add_message(current_conv, "user", user_input)
     
-    # Vérifier la disponibilité des documents
-    if not current_conv.get("vector_store"):
-        # Tenter de reconstruire le vector store si des documents existent
-        if current_conv.get("documents"):
-            with st.spinner("Chargement des documents..."):
-                try:
-                    for doc in current_conv["documents"]:
-                        if os.path.exists(doc.get("file_path", "")):
-                            vector_store = PDFProcessor.process_pdf(doc["file_path"])
-                            if vector_store:
-                                if current_conv["vector_store"]:
-                                    current_conv["vector_store"].merge_from(vector_store)
-                                else:
-                                    current_conv["vector_store"] = vector_store
-                except Exception as e:
-                    st.error(f"Erreur de chargement: {str(e)}")
+    # Vector store des documents prêts : les index sont en cache, seuls les
+    # documents devenus prêts depuis (traités par un autre processus) le changent
+    if current_conv.get("documents"):
+        with st.spinner("Chargement des documents..."):
+            try:
+                current_conv["vector_store"] = AssistantService.documents_vector_store(
+                    current_conv["documents"], st.session_state.current_conversation
+                )
+            except Exception as e:
+                st.error(f"Erreur de chargement: {str(e)}")
     
     # Générer la réponse
     with st.spinner("L'Assistant analyse..."):
@@ -106,25 +98,16 @@ def handle_user_message(user_input):
             if current_conv.get("vector_store"):
                 ai_response = ChatManager.generate_response(
                     user_input, 
-                    current_conv["vector_store"]
+                    current_conv["vector_store"],
+                    session_id=st.session_state.session_id
                 )
             else:
                 ai_response = "Aucun document valide n'a pu être chargé. Veuillez vérifier vos fichiers PDF."
             
-            current_conv["messages"].append({
-                "role": "ai",
-                "content": ai_response,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            ConversationStorage.save_conversations()
+            add_message(current_conv, "ai", ai_response)
             
         except Exception as e:
-            current_conv["messages"].append({
-                "role": "ai",
-                "content": f"Erreur: {str(e)}",
-                "timestamp": datetime.now().isoformat()
-            })
+            add_message(current_conv, "ai", f"Erreur: {str(e)}")
     
     st.rerun()
 
@@ -133,6 +116,7 @@ def main():
     UI.setup_page()
     UI.init_session_state()
     ConversationStorage.cleanup_old_files()
+    AssistantService.cleanup_uploads()
     
     # Interface
     uploaded_files = UI.render_sidebar()
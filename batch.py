@@ -0,0 +1,235 @@
+"""
+Questions-réponses en lot sur un corpus de PDF
+
+Pose la même liste de questions à chaque PDF d'un dossier (critères de
+présélection de CV, clauses à extraire, ...) :
+
+    python batch.py --pdfs ./cvs --questions criteres.txt --output resultats.jsonl
+
+Les documents passent par le pipeline d'ingestion habituel (index persistés,
+déjà calculés si le document est connu), la recherche est vectorisée sur
+toutes les questions en une requête FAISS par document, et les appels au LLM
+sont parallélisés sous une limite de débit. Chaque réponse est écrite dès
+qu'elle est obtenue : une exécution interrompue reprend là où elle s'était
+arrêtée en relançant la même commande (réponses reconnues au texte de leur
+question).
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from utils.chat_manager import ChatManager
+from utils.pdf_processor import PDFProcessor
+from utils.service import AssistantService
+from utils.scheduler import scheduler, Scheduler, BACKGROUND
+
+FIELDS = ["document", "document_id", "question_index", "question", "answer", "timestamp"]
+
+
+class RateLimiter:
+    """Limite le nombre de requêtes démarrées par minute"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ResultWriter:
+    """Écrit les résultats en JSONL ou CSV (selon l'extension) et sert de checkpoint"""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.lower().endswith(".csv")
+
+    def completed(self):
+        """
+        Clés (document_id, empreinte de la question) déjà présentes dans le fichier de sortie
+
+        Les réponses sont reconnues au texte de la question, pas à sa
+        position : modifier ou réordonner le fichier de questions ne leur
+        attribue pas la réponse d'une autre. Une exécution interrompue pendant
+        une écriture laisse un dernier enregistrement incomplet : il est
+        ignoré et retiré du fichier avant que les suivants y soient ajoutés.
+        """
+        if not os.path.exists(self.path):
+            return set()
+        # newline="" : fins de ligne conservées pour réécrire le fichier à l'identique
+        with open(self.path, newline="", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+
+        rows, end = self._read_rows(lines)
+        if end < len(lines):
+            print(f"[reprise] enregistrement incomplet retiré de {self.path}", file=sys.stderr)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                f.writelines(lines[:end])
+            os.replace(tmp_path, self.path)
+        return {(row["document_id"], question_key(row["question"])) for row in rows}
+
+    def _read_rows(self, lines):
+        """Enregistrements complets et nombre de lignes qu'ils occupent"""
+        rows, end, rest = [], 0, len(lines)
+        if self.is_csv:
+            if not lines or not lines[0].endswith("\n"):
+                return rows, end  # En-tête incomplet
+            reader = csv.DictReader(iter(lines))
+            end = 1
+            for row in reader:
+                # Champs manquants ou fin de ligne absente : écriture interrompue
+                if None in row or None in row.values() or not lines[reader.line_num - 1].endswith("\n"):
+                    rest = reader.line_num
+                    break
+                rows.append(row)
+                end = reader.line_num
+        else:
+            for index, line in enumerate(lines):
+                if line.strip():
+                    try:
+                        if not line.endswith("\n"):
+                            raise ValueError("fin de ligne absente")
+                        row = json.loads(line)
+                        if not isinstance(row, dict) or not row.keys() >= set(FIELDS):
+                            raise ValueError("champs manquants")
+                        rows.append(row)
+                    except ValueError:
+                        rest = index + 1
+                        break
+                end = index + 1
+
+        if any(line.strip() for line in lines[rest:]):
+            # Seul le dernier enregistrement peut être incomplet : le reste est à vérifier
+            raise ValueError(f"{self.path} : enregistrement illisible ligne {end + 1}")
+        return rows, end
+
+    def write(self, row):
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            if self.is_csv:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def question_key(question):
+    """Empreinte du texte d'une question (clé de reprise)"""
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+
+
+def load_questions(path):
+    """Charge les questions : liste JSON ou une question par ligne (# pour commenter)"""
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            return [str(q) for q in json.load(f)]
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def ingest_corpus(pdf_dir):
+    """Indexe tous les PDF du dossier et retourne [(nom, doc_id)] des documents prêts"""
+    documents = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        file_path = os.path.join(pdf_dir, name)
+        doc_id = AssistantService.compute_document_id(file_path)
+        status = AssistantService.ingest(doc_id, file_path, session_id="batch")
+        if status["status"] == "ready":
+            documents.append((name, doc_id))
+        else:
+            print(f"[ignoré] {name}: {status.get('error', status['status'])}", file=sys.stderr)
+    return documents
+
+
+async def run(args):
+    questions = load_questions(args.questions)
+    if not questions:
+        raise SystemExit("Aucune question trouvée")
+
+    documents = await asyncio.to_thread(ingest_corpus, args.pdfs)
+    writer = ResultWriter(args.output)
+    done = writer.completed()
+
+    # Un seul appel d'embedding pour toutes les questions
+    def embed_questions():
+        with scheduler.slot("batch", BACKGROUND, Scheduler.estimate_tokens(*questions)):
+            return PDFProcessor.get_embeddings().embed_documents(questions)
+
+    query_vectors = await asyncio.to_thread(embed_questions)
+
+    limiter = RateLimiter(args.rpm)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failures = 0
+
+    async def answer(name, doc_id, index, passages):
+        nonlocal failures
+        async with semaphore:
+            await limiter.wait()
+            try:
+                response = await ChatManager.agenerate_from_docs(questions[index], passages)
+            except Exception as e:
+                # Non écrite : la question sera reposée à la prochaine exécution
+                failures += 1
+                print(f"[erreur] {name} / question {index}: {e}", file=sys.stderr)
+                return
+        writer.write({
+            "document": name,
+            "document_id": doc_id,
+            "question_index": index,
+            "question": questions[index],
+            "answer": response,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    tasks = []
+    for name, doc_id in documents:
+        pending = [i for i in range(len(questions)) if (doc_id, question_key(questions[i])) not in done]
+        if not pending:
+            continue
+        vector_store = await asyncio.to_thread(AssistantService.load_vector_store, [doc_id])
+        passages = ChatManager.retrieve_batch(
+            [questions[i] for i in pending],
+            [query_vectors[i] for i in pending],
+            vector_store
+        )
+        tasks.extend(
+            asyncio.create_task(answer(name, doc_id, i, docs))
+            for i, docs in zip(pending, passages)
+        )
+
+    total = len(documents) * len(questions)
+    print(f"{len(documents)} documents, {len(questions)} questions : "
+          f"{total - len(tasks)} réponses déjà présentes, {len(tasks)} à calculer")
+    await asyncio.gather(*tasks)
+    print(f"Terminé : {len(tasks) - failures} réponses écrites dans {args.output}, {failures} échecs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Questions-réponses en lot sur un dossier de PDF")
+    parser.add_argument("--pdfs", required=True, help="Dossier contenant les PDF")
+    parser.add_argument("--questions", required=True, help="Fichier de questions (.txt ou .json)")
+    parser.add_argument("--output", required=True, help="Fichier de résultats (.jsonl ou .csv)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Appels LLM simultanés")
+    parser.add_argument("--rpm", type=float, default=60, help="Appels LLM maximum par minute")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark de la représentation des messages : dictionnaires contre Message
+
+Génère un fichier de conversations au format de conversations.json puis
+mesure, pour le chargement historique (dictionnaires + datetime) et pour
+le modèle compact (utils.models.Message), le temps de chargement et la
+mémoire occupée (horodatages convertis dans les deux cas). Vérifie aussi
+que la sérialisation est réversible.
+
+    python -m benchmarks.bench_messages [--conversations 2000] [--messages 50]
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from utils.models import Message
+
+PARIS = timezone(timedelta(hours=2))
+
+
+def make_conversations(n_conversations, n_messages, rng):
+    start = datetime(2025, 4, 24, 14, 3, 46, 286183)
+    words = ["document", "résumé", "contrat", "clause", "analyse", "profil", "page", "article"]
+    conversations = {}
+    for c in range(n_conversations):
+        messages = []
+        for m in range(n_messages):
+            sent_at = start + timedelta(seconds=rng.randint(0, 10_000_000), microseconds=rng.randint(0, 999_999))
+            messages.append({
+                "role": "user" if m % 2 == 0 else "ai",
+                "content": " ".join(rng.choices(words, k=rng.randint(5, 60))),
+                # Les formats présents dans conversations.json, dont des dates avec fuseau
+                "timestamp": (sent_at.astimezone(PARIS) if m % 5 == 0 else sent_at).isoformat(sep=" " if m % 3 else "T")
+            })
+        conversations[f"conv-{c}"] = {"id": f"conv-{c}", "title": f"Conversation {c}", "messages": messages, "documents": []}
+    return json.dumps(conversations)
+
+
+def load_dicts(raw):
+    """Chargement historique de ConversationStorage.load_conversations"""
+    conversations = json.loads(raw)
+    for conv in conversations.values():
+        for msg in conv["messages"]:
+            msg["timestamp"] = datetime.fromisoformat(msg["timestamp"])
+    return conversations
+
+
+def load_models(raw):
+    """Chargement actuel de ConversationStorage.load_conversations"""
+    conversations = json.loads(raw)
+    for conv in conversations.values():
+        conv["messages"] = Message.from_dicts(conv["messages"])
+    return conversations
+
+
+def measure(loader, raw, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loader(raw)
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = loader(raw)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(durations), memory, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raw = make_conversations(args.conversations, args.messages, random.Random(args.seed))
+    total = args.conversations * args.messages
+    print(f"{args.conversations} conversations × {args.messages} messages ({len(raw) / 1e6:.1f} Mo de JSON)")
+
+    results = {}
+    for label, loader in (("dictionnaires", load_dicts), ("Message", load_models)):
+        duration, memory, results[label] = measure(loader, raw, args.repeat)
+        print(f"  {label:<14} chargement = {duration * 1000:7.1f} ms   mémoire = {memory / 1e6:6.1f} Mo "
+              f"({memory / total:.0f} o/message)")
+
+    # Réversibilité : mêmes instants, fuseau compris, une fois resérialisés
+    parsed = results["dictionnaires"]
+    for conv_id, conv in results["Message"].items():
+        for msg, expected in zip(conv["messages"], parsed[conv_id]["messages"]):
+            restored = Message.from_dict(msg.to_dict())
+            assert restored == msg and restored.role is msg.role
+            sent_at = datetime.fromisoformat(msg.to_dict()["timestamp"])
+            assert sent_at == expected["timestamp"]
+            assert sent_at.utcoffset() == expected["timestamp"].utcoffset()
+            assert msg.clock == expected["timestamp"].strftime("%H:%M")
+    print("  sérialisation réversible : OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark du re-ranking : qualité gagnée contre latence ajoutée
+
+Passages réels : Constitution_France.pdf découpé comme à l'ingestion
+(PDFProcessor.split_pages). Chaque question du jeu étiqueté ci-dessous est
+associée à un extrait de la réponse ; les passages pertinents sont ceux qui
+contiennent cet extrait. Les RERANK_CANDIDATES premiers passages d'une
+première recherche sont re-classés, et l'on compare le rappel@k et le MRR
+avant et après re-ranking, ainsi que la latence ajoutée par requête.
+
+Première recherche : embeddings OpenAI (--first-stage openai, clé requise)
+ou, hors ligne, vecteurs de trigrammes de caractères (--first-stage
+trigram), plus proches du lexical qu'un vrai modèle d'embeddings.
+
+    python -m benchmarks.bench_rerank [--first-stage trigram] [--method lexical]
+"""
+import argparse
+import re
+import statistics
+import time
+import zlib
+from types import SimpleNamespace
+import numpy as np
+from utils.config import Config
+from utils.pdf_processor import PDFProcessor
+from utils.reranker import Reranker
+
+# (question, extrait du passage qui y répond)
+QUESTIONS = [
+    ("Quelle est la langue officielle de la République ?", "La langue de la République est le français"),
+    ("Quelle est la devise de la France ?", "La devise de la République est"),
+    ("À qui appartient la souveraineté nationale ?", "La souveraineté nationale appartient au peuple"),
+    ("Pour combien de temps le chef de l'État est-il élu ?", "est élu pour cinq ans"),
+    ("Combien de mandats de suite un président peut-il faire ?", "plus de deux mandats consécutifs"),
+    ("Qui choisit le Premier ministre ?", "Le Président de la République nomme le Premier ministre"),
+    ("Qui préside le conseil des ministres ?", "préside le conseil des ministres"),
+    ("Dans quel délai une loi adoptée doit-elle être promulguée ?", "promulgue les lois dans les quinze"),
+    ("Le président peut-il dissoudre l'Assemblée nationale ?", "prononcer la dissolution de l'Assemblée nationale"),
+    ("Quels pouvoirs le président a-t-il si les institutions sont menacées ?", "menacées d'une manière grave et immédiate"),
+    ("Qui détermine la politique de la nation ?", "détermine et conduit la politique de la nation"),
+    ("Qui dirige l'action du Gouvernement ?", "dirige l'action du Gouvernement"),
+    ("Un ministre peut-il rester député ?", "incompatibles avec l'exercice de tout mandat parlementaire"),
+    ("Combien de députés au maximum siègent à l'Assemblée ?", "cinq cent soixante-dix-sept"),
+    ("Quel est le nombre maximum de sénateurs ?", "trois cent quarante-huit"),
+    ("Un parlementaire peut-il être poursuivi pour ses votes ?", "à l'occasion des opinions ou votes émis"),
+    ("Le mandat impératif est-il permis ?", "Tout mandat impératif est nul"),
+    ("Qui autorise la déclaration de guerre ?", "La déclaration de guerre est autorisée par le Parlement"),
+    ("Comment l'état de siège est-il décidé ?", "L'état de siège est décrété en conseil des ministres"),
+    ("Qui peut proposer des lois ?", "L'initiative des lois appartient concurremment"),
+    ("Combien de signatures faut-il pour une motion de censure ?", "signée par un dixième au moins des membres"),
+    ("Qui négocie les traités internationaux ?", "négocie et ratifie les traités"),
+    ("Combien de membres compte le Conseil constitutionnel ?", "comprend neuf membres"),
+    ("Qui contrôle la régularité de l'élection présidentielle ?", "veille à la régularité de l'élection du Président"),
+    ("Qui garantit l'indépendance de la justice ?", "garant de l'indépendance de l'autorité judiciaire"),
+    ("La peine de mort peut-elle être prononcée ?", "Nul ne peut être condamné à la peine de mort"),
+    ("Peut-on être détenu arbitrairement ?", "Nul ne peut être arbitrairement détenu"),
+    ("Qui juge les ministres pour les crimes commis dans leurs fonctions ?", "Cour de justice de la République"),
+    ("Qui peut prendre l'initiative d'une révision de la Constitution ?", "L'initiative de la révision de la Constitution appartient"),
+    ("La forme républicaine du gouvernement peut-elle être révisée ?", "La forme républicaine du Gouvernement ne peut faire l'objet d'une révision"),
+    ("Quelles sont les collectivités territoriales ?", "Les collectivités territoriales de la République sont les communes"),
+    ("Quel est le rôle du Défenseur des droits ?", "Le Défenseur des droits veille au respect des droits et libertés"),
+]
+
+
+def compact(text):
+    """Texte comparable malgré les espaces parasites de l'extraction PDF"""
+    return re.sub(r"\s+", "", text.lower().replace("’", "'"))
+
+
+def trigram_vectors(texts, dim=1 << 14):
+    """Vecteurs normalisés de trigrammes de caractères hachés"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = " ".join(Reranker.tokenize(text))
+        for i in range(len(text) - 2):
+            vectors[row, zlib.crc32(text[i:i + 3].encode()) % dim] += 1
+    np.log1p(vectors, out=vectors)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def openai_vectors(texts):
+    vectors = np.asarray(PDFProcessor.get_embeddings().embed_documents(texts), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def first_rank(ranked, relevant):
+    """Rang du premier passage pertinent (len(ranked) s'il n'y en a aucun)"""
+    return next((rank for rank, i in enumerate(ranked) if i in relevant), len(ranked))
+
+
+def evaluate(rankings, top_k):
+    recall = sum(rank < top_k for rank in rankings) / len(rankings)
+    mrr = sum(1 / (rank + 1) for rank in rankings if rank < top_k) / len(rankings)
+    return recall, mrr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default="Constitution_France.pdf")
+    parser.add_argument("--first-stage", default="trigram", choices=["trigram", "openai"])
+    parser.add_argument("--candidates", type=int, default=Config.RERANK_CANDIDATES)
+    parser.add_argument("--top-k", type=int, default=Config.RETRIEVAL_K)
+    parser.add_argument("--method", default="lexical", choices=["lexical", "cross-encoder"])
+    parser.add_argument("--budget-ms", type=float, default=Config.RERANK_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=20, help="Répétitions pour la latence")
+    args = parser.parse_args()
+
+    chunks = PDFProcessor.split_pages(PDFProcessor.extract_pages(args.pdf))
+    texts = [chunk["text"] for chunk in chunks]
+    docs = [SimpleNamespace(page_content=text) for text in texts]
+    compact_texts = [compact(text) for text in texts]
+
+    questions = [question for question, _ in QUESTIONS]
+    labels = []
+    for question, answer in QUESTIONS:
+        relevant = {i for i, text in enumerate(compact_texts) if compact(answer) in text}
+        if not relevant:
+            raise SystemExit(f"Extrait introuvable dans {args.pdf} : {answer}")
+        labels.append(relevant)
+
+    embed = openai_vectors if args.first_stage == "openai" else trigram_vectors
+    chunk_vectors = embed(texts)
+    query_vectors = embed(questions)
+
+    Reranker.warm_up(args.method)  # Chargement du modèle hors mesure
+    first_ranks, reranked_ranks, latencies = [], [], []
+    for question, query_vector, relevant in zip(questions, query_vectors, labels):
+        candidates = list(np.argsort(-(chunk_vectors @ query_vector))[:args.candidates])
+        first_ranks.append(first_rank(candidates, relevant))
+
+        candidate_docs = [docs[i] for i in candidates]
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            # top_k = nombre de candidats pour connaître le rang exact du passage pertinent
+            reranked = Reranker.rerank(
+                question, candidate_docs, len(candidate_docs), budget_ms=args.budget_ms, method=args.method
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+        reranked_ranks.append(first_rank([candidates[candidate_docs.index(doc)] for doc in reranked], relevant))
+
+    latencies.sort()
+    print(
+        f"{args.pdf} : {len(texts)} passages, {len(questions)} questions étiquetées, "
+        f"{args.candidates} candidats ({args.first_stage}), top-{args.top_k}, méthode {args.method}"
+    )
+    for label, ranks in (("première recherche", first_ranks), ("re-ranking", reranked_ranks)):
+        recall, mrr = evaluate(ranks, args.top_k)
+        print(f"  {label:<18} rappel@{args.top_k} = {recall:.3f}   MRR@{args.top_k} = {mrr:.3f}")
+    print(f"  pertinent hors des candidats : {sum(rank >= args.candidates for rank in first_ranks)}")
+    print(
+        f"  latence ajoutée  p50 = {statistics.median(latencies):.2f} ms   "
+        f"p95 = {latencies[int(len(latencies) * 0.95)]:.2f} ms   max = {latencies[-1]:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
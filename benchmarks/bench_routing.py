@@ -0,0 +1,176 @@
+"""
+Benchmark du routage multi-documents : index fusionné contre RoutedStore
+
+Corpus réel : Constitution_France.pdf découpée en documents de quelques
+pages (--pages-per-document), plus les autres PDF fournis (temp_pdfs) comme
+documents hors sujet. Chaque document passe par le pipeline d'ingestion
+(AssistantService.ingest : passages, index FAISS, profil de routage) dans
+un répertoire de données temporaire. Les questions étiquetées de
+bench_rerank sont posées au FAISS fusionné et à RoutedStore (mots-clés,
+vecteurs résumés, recherche dans les seuls index routés) : rappel@k et MRR
+du passage qui contient la réponse, document visé parmi les documents
+routés, latence à chaud et latence avec chargement des index par document
+(cache vidé avant chaque question).
+
+Embeddings : vecteurs de trigrammes hors ligne (--embeddings trigram) ou
+modèle OpenAI configuré (--embeddings openai, clé requise).
+
+    python -m benchmarks.bench_routing [--pages-per-document 2] [--embeddings trigram]
+"""
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Artefacts du benchmark isolés des données de l'application (embeddings de test)
+os.environ["DOCUMIND_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_routing_")
+
+from langchain.embeddings.base import Embeddings
+from PyPDF2 import PdfReader, PdfWriter
+from benchmarks.bench_rerank import QUESTIONS, compact, evaluate, trigram_vectors
+from utils.artifact_cache import ArtifactCache
+from utils.config import Config
+from utils.pdf_processor import PDFProcessor
+from utils.router import DocumentRouter, RoutedStore
+from utils.service import AssistantService
+
+
+class TrigramEmbeddings(Embeddings):
+    """Embeddings hors ligne : trigrammes de caractères hachés"""
+
+    def embed_documents(self, texts):
+        return trigram_vectors(texts).tolist()
+
+    def embed_query(self, text):
+        return trigram_vectors([text])[0].tolist()
+
+
+def split_pdf(pdf_path, pages_per_document, output_dir):
+    """Découpe un PDF en documents de pages_per_document pages"""
+    reader = PdfReader(pdf_path)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    paths = []
+    for start in range(0, len(reader.pages), pages_per_document):
+        writer = PdfWriter()
+        for page in reader.pages[start:start + pages_per_document]:
+            writer.add_page(page)
+        path = os.path.join(output_dir, f"{stem}_p{start + 1:03d}.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        paths.append(path)
+    return paths
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def answer_rank(docs, answer, top_k):
+    """Rang du premier passage qui contient la réponse (top_k s'il n'y en a aucun)"""
+    return next((rank for rank, doc in enumerate(docs) if compact(answer) in compact(doc.page_content)), top_k)
+
+
+def timed(search, question, top_k):
+    start = time.perf_counter()
+    docs = search(question, k=top_k)
+    return docs, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default="Constitution_France.pdf")
+    parser.add_argument("--pages-per-document", type=int, default=2)
+    parser.add_argument("--distractors", default="temp_pdfs/*.pdf", help="PDF hors sujet ajoutés au corpus")
+    parser.add_argument("--embeddings", default="trigram", choices=["trigram", "openai"])
+    parser.add_argument("--top-k", type=int, default=Config.RETRIEVAL_K)
+    args = parser.parse_args()
+
+    if args.embeddings == "trigram":
+        PDFProcessor.get_embeddings = staticmethod(TrigramEmbeddings)
+    try:
+        run(args)
+    finally:
+        shutil.rmtree(Config.DATA_DIR, ignore_errors=True)
+
+
+def run(args):
+    split_dir = os.path.join(Config.DATA_DIR, "corpus")
+    os.makedirs(split_dir)
+    paths = split_pdf(args.pdf, args.pages_per_document, split_dir) + sorted(glob.glob(args.distractors))
+
+    start = time.perf_counter()
+    doc_ids = []
+    for path in paths:
+        doc_id = AssistantService.compute_document_id(path)
+        status = AssistantService.ingest(doc_id, path)
+        if status["status"] == "ready":
+            doc_ids.append(doc_id)
+        else:
+            print(f"[ignoré] {os.path.basename(path)}: {status.get('error', status['status'])}", file=sys.stderr)
+    ingest_seconds = time.perf_counter() - start
+
+    # Chargement des deux vector stores, comme AssistantService.load_vector_store
+    start = time.perf_counter()
+    merged = None
+    for doc_id in doc_ids:
+        index = AssistantService.load_index(doc_id)
+        if merged:
+            merged.merge_from(index)
+        else:
+            merged = index
+    merged_load_ms = (time.perf_counter() - start) * 1000
+
+    DocumentRouter._shard.cache_clear()
+    start = time.perf_counter()
+    routed = RoutedStore(doc_ids)
+    routed_load_ms = (time.perf_counter() - start) * 1000
+
+    chunks = {
+        doc_id: [compact(chunk["text"]) for chunk in ArtifactCache.load("chunks", ArtifactCache.chunks_key(doc_id))]
+        for doc_id in doc_ids
+    }
+    ranks = {"fusionné": [], "routé": []}
+    latencies = {"fusionné": [], "routé": [], "routé (index chargés)": []}
+    routed_correctly = 0
+    for question, answer in QUESTIONS:
+        targets = {doc_id for doc_id, texts in chunks.items() if any(compact(answer) in text for text in texts)}
+        if not targets:
+            raise SystemExit(f"Extrait introuvable dans le corpus : {answer}")
+
+        docs, latency = timed(merged.similarity_search, question, args.top_k)
+        ranks["fusionné"].append(answer_rank(docs, answer, args.top_k))
+        latencies["fusionné"].append(latency)
+
+        docs, latency = timed(routed.similarity_search, question, args.top_k)
+        ranks["routé"].append(answer_rank(docs, answer, args.top_k))
+        latencies["routé"].append(latency)
+
+        DocumentRouter._shard.cache_clear()
+        _, latency = timed(routed.similarity_search, question, args.top_k)
+        latencies["routé (index chargés)"].append(latency)
+
+        selected = routed.route(question, routed.embeddings.embed_query(question))
+        routed_correctly += bool(targets & set(selected))
+
+    print(
+        f"{len(doc_ids)} documents ({args.pdf} par {args.pages_per_document} pages + hors sujet), "
+        f"{sum(map(len, chunks.values()))} passages, {len(QUESTIONS)} questions, top-{args.top_k}, "
+        f"{Config.ROUTING_TOP_DOCUMENTS} documents routés, embeddings {args.embeddings}"
+    )
+    print(f"  ingestion {ingest_seconds:.1f} s   chargement fusionné = {merged_load_ms:.0f} ms   "
+          f"RoutedStore = {routed_load_ms:.0f} ms")
+    for label, values in ranks.items():
+        recall, mrr = evaluate(values, args.top_k)
+        print(f"  {label:<9} rappel@{args.top_k} = {recall:.3f}   MRR@{args.top_k} = {mrr:.3f}")
+    for label, values in latencies.items():
+        print(f"  {label:<22} latence p50 = {statistics.median(values):.2f} ms   p95 = {percentile(values, 0.95):.2f} ms")
+    print(f"  document visé parmi les documents routés : {routed_correctly / len(QUESTIONS):.3f}")
+
+
+if __name__ == "__main__":
+    main()
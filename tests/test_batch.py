@@ -0,0 +1,37 @@
+import pytest
+from batch import ResultWriter, question_key
+
+
+def make_row(index, question):
+    return {
+        "document": "a.pdf",
+        "document_id": "doc",
+        "question_index": index,
+        "question": question,
+        "answer": "première ligne\nseconde ligne",
+        "timestamp": "2025-04-24T14:03:11"
+    }
+
+
+@pytest.mark.parametrize("extension", ["jsonl", "csv"])
+def test_interrupted_write_is_dropped_before_resuming(tmp_path, extension):
+    path = tmp_path / f"resultats.{extension}"
+    writer = ResultWriter(str(path))
+    writer.write(make_row(0, "Q0 ?"))
+    complete = path.read_bytes()
+    writer.write(make_row(1, "Q1 ?"))
+    path.write_bytes(path.read_bytes()[:-5])  # Exécution tuée pendant l'écriture
+
+    assert writer.completed() == {("doc", question_key("Q0 ?"))}
+    assert path.read_bytes() == complete
+    writer.write(make_row(1, "Q1 ?"))
+    assert len(writer.completed()) == 2
+
+
+def test_answers_follow_question_text_not_position(tmp_path):
+    writer = ResultWriter(str(tmp_path / "resultats.jsonl"))
+    writer.write(make_row(0, "Quel est le salaire ?"))
+    # Fichier de questions réordonné : la question 0 est désormais une autre
+    done = writer.completed()
+    assert ("doc", question_key("Quelle est la durée ?")) not in done
+    assert ("doc", question_key("Quel est le salaire ?")) in done
@@ -0,0 +1,26 @@
+import sys
+from datetime import datetime
+from utils.models import Message
+
+
+def test_round_trip_keeps_instant_and_offset():
+    for timestamp in ("2025-04-24T14:03:11.468526", "2025-04-24T14:03:11+02:00", "2025-04-24 23:59:59.000001-05:30"):
+        message = Message.from_dict({"role": "user", "content": "x", "timestamp": timestamp})
+        restored = datetime.fromisoformat(message.to_dict()["timestamp"])
+        expected = datetime.fromisoformat(timestamp)
+        assert restored == expected and restored.utcoffset() == expected.utcoffset()
+        assert message.clock == expected.strftime("%H:%M")
+        assert Message.from_dict(message.to_dict()) == message
+
+
+def test_roles_are_interned():
+    messages = Message.from_dicts([
+        {"role": "".join(["us", "er"]), "content": "a", "timestamp": "2025-04-24T14:03:11"},
+        {"role": "".join(["us", "er"]), "content": "b", "timestamp": "2025-04-24T14:03:12"},
+    ])
+    assert messages[0].role is messages[1].role is sys.intern("user")
+
+
+def test_epoch_is_utc_for_aware_timestamps():
+    message = Message.from_dict({"role": "ai", "content": "x", "timestamp": "1970-01-01T02:00:00+02:00"})
+    assert (message.timestamp, message.utc_offset) == (0, 7200)
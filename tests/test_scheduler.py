@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import time
+from utils.scheduler import Scheduler, INTERACTIVE, BACKGROUND
+
+
+def make_scheduler(tmp_path, **overrides):
+    settings = dict(requests_per_minute=600, tokens_per_minute=10**6, max_concurrent=1, max_wait=30)
+    settings.update(overrides)
+    return Scheduler(str(tmp_path / "scheduler.db"), **settings)
+
+
+def wait_for_waiter(db_path, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with sqlite3.connect(db_path) as conn:
+            if conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]:
+                return
+        time.sleep(0.02)
+    raise AssertionError("aucun appel en attente")
+
+
+def test_waiter_removed_by_another_process_is_still_admitted(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    lease_id = scheduler.acquire("a", INTERACTIVE, 10)
+
+    admitted = threading.Event()
+
+    def waiter():
+        scheduler.release(scheduler.acquire("b", INTERACTIVE, 10))
+        admitted.set()
+
+    thread = threading.Thread(target=waiter, daemon=True)
+    thread.start()
+    wait_for_waiter(scheduler.db_path)
+
+    # Nettoyage des appels « abandonnés » par un autre processus
+    with sqlite3.connect(scheduler.db_path) as conn:
+        conn.execute("DELETE FROM waiters")
+    scheduler.release(lease_id)
+
+    assert admitted.wait(timeout=5)
+    assert scheduler.stats()["queues"]["interactive"]["depth"] == 0
+
+
+def test_interactive_calls_pass_background_calls(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    lease_id = scheduler.acquire("ingestion", BACKGROUND, 10)
+
+    order = []
+
+    def call(session_id, priority):
+        scheduler.release(scheduler.acquire(session_id, priority, 10))
+        order.append(session_id)
+
+    background = threading.Thread(target=call, args=("ingestion", BACKGROUND), daemon=True)
+    background.start()
+    wait_for_waiter(scheduler.db_path)
+    interactive = threading.Thread(target=call, args=("chat", INTERACTIVE), daemon=True)
+    interactive.start()
+    time.sleep(0.3)
+
+    scheduler.release(lease_id)
+    background.join(timeout=5)
+    interactive.join(timeout=5)
+    assert order == ["chat", "ingestion"]
+
+
+def test_request_budget_is_shared_by_instances(tmp_path):
+    # Deux instances sur la même base : deux processus différents
+    first = make_scheduler(tmp_path, requests_per_minute=60, max_concurrent=10)
+    second = make_scheduler(tmp_path, requests_per_minute=60, max_concurrent=10)
+    for _ in range(58):
+        first.release(first.acquire("a", INTERACTIVE, 10))
+    first.release(first.acquire("a", INTERACTIVE, 10))
+    second.release(second.acquire("b", INTERACTIVE, 10))
+
+    start = time.time()
+    first.release(first.acquire("a", INTERACTIVE, 10))
+    # Seau vide : une requête par seconde
+    assert time.time() - start > 0.5
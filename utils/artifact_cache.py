@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import shutil
+from utils.config import Config
+from utils.ocr import OCR_AVAILABLE
+
+
+class ArtifactCache:
+    """
+    Cache persistant des étapes d'ingestion : pages → passages → embeddings
+
+    Les pages sont identifiées par le document et les paramètres
+    d'extraction ; chaque étape suivante par le contenu de l'étape
+    précédente et ses propres paramètres. Modifier la taille des passages ne
+    refait donc que le découpage et les embeddings ; ré-extraire des pages
+    au texte identique (autre langue d'OCR, document sans page scannée) ne
+    refait aucun embedding. Les clés ne dépendent pas des paquets installés :
+    tous les processus qui partagent Config.DATA_DIR calculent les mêmes.
+    Les artefacts sont indépendants par document : l'échec de l'un
+    n'invalide jamais les autres.
+    """
+    EXTRACTOR_VERSION = 1  # À incrémenter si l'extraction du texte change
+    _digests = {}  # Empreinte du contenu des pages, par clé (artefacts immuables)
+
+    @staticmethod
+    def _key(*parts):
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def pages_key(doc_hash, ocr=True):
+        """
+        Clé des pages d'un document
+
+        Args:
+            ocr (bool): False pour des pages extraites sans OCR alors que
+                certaines sont sans texte (OCR indisponible dans ce processus)
+        """
+        return ArtifactCache._key(
+            "pages", doc_hash, ArtifactCache.EXTRACTOR_VERSION, Config.OCR_LANG if ocr else None
+        )
+
+    @staticmethod
+    def find_pages_key(doc_hash):
+        """
+        Clé des pages à utiliser dans ce processus
+
+        Les pages complètes sont toujours préférées ; les pages extraites
+        sans OCR ne servent qu'aux processus où l'OCR est indisponible.
+        """
+        key = ArtifactCache.pages_key(doc_hash)
+        if OCR_AVAILABLE or os.path.exists(ArtifactCache.path("pages", key) + ".json"):
+            return key
+        return ArtifactCache.pages_key(doc_hash, ocr=False)
+
+    @staticmethod
+    def pages_digest(doc_hash):
+        """Empreinte du contenu des pages d'un document, None si elles n'ont pas été extraites"""
+        key = ArtifactCache.find_pages_key(doc_hash)
+        if key not in ArtifactCache._digests:
+            pages = ArtifactCache.load("pages", key)
+            if pages is None:
+                return None
+            ArtifactCache._digests[key] = ArtifactCache._key(pages)
+        return ArtifactCache._digests[key]
+
+    @staticmethod
+    def chunks_key(doc_hash):
+        """Clé des passages (None tant que les pages n'ont pas été extraites)"""
+        digest = ArtifactCache.pages_digest(doc_hash)
+        if digest is None:
+            return None
+        return ArtifactCache._key("chunks", digest, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+
+    @staticmethod
+    def embeddings_key(doc_hash):
+        """Clé de l'index FAISS (None tant que les pages n'ont pas été extraites)"""
+        chunks_key = ArtifactCache.chunks_key(doc_hash)
+        if chunks_key is None:
+            return None
+        return ArtifactCache._key("embeddings", chunks_key, Config.EMBEDDING_MODEL)
+
+    @staticmethod
+    def path(stage, key):
+        return os.path.join(Config.ARTIFACT_DIR, stage, key)
+
+    @staticmethod
+    def load(stage, key):
+        """Retourne l'artefact JSON d'une étape, None s'il n'a pas encore été calculé"""
+        try:
+            with open(ArtifactCache.path(stage, key) + ".json", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def save(stage, key, value):
+        """Écrit l'artefact JSON d'une étape de manière atomique"""
+        path = ArtifactCache.path(stage, key) + ".json"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def get_or_compute(stage, key, compute):
+        """
+        Retourne l'artefact JSON d'une étape, en le calculant s'il est absent
+
+        Args:
+            stage (str): Nom de l'étape ("chunks", "profiles")
+            key (str): Clé de l'artefact
+            compute (callable): Calcule l'artefact (sérialisable en JSON)
+        """
+        value = ArtifactCache.load(stage, key)
+        if value is not None:
+            return value
+
+        value = compute()
+        ArtifactCache.save(stage, key, value)
+        return value
+
+    @staticmethod
+    def save_directory(path, write):
+        """
+        Écrit un artefact sous forme de dossier (index FAISS) de manière atomique
+
+        Args:
+            path (str): Dossier final de l'artefact
+            write (callable): Reçoit le dossier temporaire dans lequel écrire
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write(tmp_path)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
@@ -1,33 +1,174 @@
+import asyncio
+import numpy as np
 from langchain.chat_models import ChatOpenAI
 from langchain.chains.question_answering import load_qa_chain
+from langchain.chains.question_answering.stuff_prompt import CHAT_PROMPT
 from utils.config import Config
+from utils.reranker import Reranker
+from utils.scheduler import scheduler, Scheduler, INTERACTIVE, BACKGROUND
 import streamlit as st
 
 class ChatManager:
     @staticmethod
-    def generate_response(question, vector_store):
+    def get_llm(streaming=False):
+        """Instancie le modèle de chat configuré"""
+        return ChatOpenAI(
+            openai_api_key=Config.get_openai_key(),
+            temperature=0.3,
+            model_name=Config.CHAT_MODEL,
+            streaming=streaming
+        )
+
+    @staticmethod
+    def retrieve(question, vector_store, session_id=None):
+        """Retourne les passages les plus pertinents pour la question"""
+        k = Config.RERANK_CANDIDATES if Config.RERANK_ENABLED else Config.RETRIEVAL_K
+        # L'embedding de la question est un appel à l'API : il passe par l'ordonnanceur
+        with scheduler.slot(session_id, INTERACTIVE, Scheduler.estimate_tokens(question)):
+            docs = vector_store.similarity_search(question, k=k)
+
+        if not Config.RERANK_ENABLED:
+            return docs
+
+        # Sélection large puis re-ranking des candidats
+        return Reranker.rerank(question, docs, Config.RETRIEVAL_K)
+
+    @staticmethod
+    def retrieve_batch(questions, query_vectors, vector_store):
+        """
+        Recherche vectorisée : une seule requête FAISS pour toutes les questions
+
+        Args:
+            questions (list[str]): Questions (utilisées pour le re-ranking)
+            query_vectors: Embeddings des questions (une ligne par question)
+            vector_store (FAISS): Index dans lequel chercher
+
+        Returns:
+            list[list[Document]]: Passages retenus pour chaque question
+        """
+        k = Config.RERANK_CANDIDATES if Config.RERANK_ENABLED else Config.RETRIEVAL_K
+        matrix = np.asarray(query_vectors, dtype=np.float32)
+        _, indices = vector_store.index.search(matrix, k)
+
+        results = []
+        for row in indices:
+            docs = []
+            for i in row:
+                if i == -1:  # Moins de k passages dans l'index
+                    continue
+                docstore_id = vector_store.index_to_docstore_id[i]
+                docs.append(vector_store.docstore.search(docstore_id))
+            results.append(docs)
+
+        if Config.RERANK_ENABLED:
+            results = [
+                Reranker.rerank(question, docs, Config.RETRIEVAL_K)
+                for question, docs in zip(questions, results)
+            ]
+        return results
+
+    @staticmethod
+    def chain_type(question):
+        """Type de chain adapté à la question : map_reduce pour les résumés"""
+        return "map_reduce" if "résumé" in question.lower() or "résume" in question.lower() else "stuff"
+
+    @staticmethod
+    def build_chain(question):
+        """Construit la chain de questions-réponses adaptée à la question"""
+        return load_qa_chain(ChatManager.get_llm(), chain_type=ChatManager.chain_type(question))
+
+    @staticmethod
+    def estimate_tokens(question, docs):
+        """Tokens d'un appel de questions-réponses : prompt et réponse"""
+        return Scheduler.estimate_tokens(question, *(doc.page_content for doc in docs)) + Config.ANSWER_TOKENS
+
+    @staticmethod
+    def estimate_cost(question, docs):
+        """
+        Requêtes et tokens consommés par la chain choisie pour la question
+
+        Une chain map_reduce fait un appel par passage puis un appel de
+        synthèse sur les réponses intermédiaires.
+        """
+        if ChatManager.chain_type(question) != "map_reduce":
+            return 1, ChatManager.estimate_tokens(question, docs)
+        tokens = sum(ChatManager.estimate_tokens(question, [doc]) for doc in docs)
+        tokens += Scheduler.estimate_tokens(question) + Config.ANSWER_TOKENS * (len(docs) + 1)
+        return len(docs) + 1, tokens
+
+    @staticmethod
+    def generate_response(question, vector_store, session_id=None):
         """Génère une réponse à partir d'une question et d'un vector store"""
         if not vector_store:
             return "Aucun document chargé. Veuillez uploader un PDF."
-            
+
         try:
             # Recherche des passages pertinents
-            docs = vector_store.similarity_search(question, k=5)
-            
+            docs = ChatManager.retrieve(question, vector_store, session_id)
+
             if not docs:
                 return "Aucune information pertinente trouvée."
-                
-            llm = ChatOpenAI(
-                openai_api_key=Config.get_openai_key(),
-                temperature=0.3,
-                model_name="gpt-3.5-turbo"
+
+            chain = ChatManager.build_chain(question)
+            requests, tokens = ChatManager.estimate_cost(question, docs)
+            with scheduler.slot(session_id, INTERACTIVE, tokens, requests):
+                return chain.run(input_documents=docs, question=question)
+
+        except Exception as e:
+            return f"Erreur lors de l'analyse: {str(e)}"
+
+    @staticmethod
+    async def astream_response(question, vector_store, session_id=None):
+        """
+        Génère une réponse token par token (utilisé par l'API en streaming)
+
+        Utilise le même prompt que la chain "stuff" afin que les réponses
+        restent identiques à celles de generate_response.
+        """
+        if not vector_store:
+            yield "Aucun document chargé. Veuillez uploader un PDF."
+            return
+
+        try:
+            # L'embedding de la question est bloquant : hors de la boucle d'événements
+            docs = await asyncio.to_thread(ChatManager.retrieve, question, vector_store, session_id)
+
+            if not docs:
+                yield "Aucune information pertinente trouvée."
+                return
+
+            messages = CHAT_PROMPT.format_messages(
+                context="\n\n".join(doc.page_content for doc in docs),
+                question=question
             )
-            
-            # Sélection du type de chain
-            chain_type = "map_reduce" if "résumé" in question.lower() or "résume" in question.lower() else "stuff"
-            chain = load_qa_chain(llm, chain_type=chain_type)
-            
-            return chain.run(input_documents=docs, question=question)
-            
+            tokens = ChatManager.estimate_tokens(question, docs)
+            lease_id = await asyncio.to_thread(scheduler.acquire, session_id or "anonyme", INTERACTIVE, tokens)
+            try:
+                async for chunk in ChatManager.get_llm(streaming=True).astream(messages):
+                    if chunk.content:
+                        yield chunk.content
+            finally:
+                await asyncio.to_thread(scheduler.release, lease_id)
+
         except Exception as e:
-            return f"Erreur lors de l'analyse: {str(e)}"
\ No newline at end of file
+            yield f"Erreur lors de l'analyse: {str(e)}"
+
+    @staticmethod
+    async def agenerate_from_docs(question, docs, session_id="batch"):
+        """
+        Génère une réponse à partir de passages déjà sélectionnés
+
+        Utilisé par le mode batch, où la recherche est faite en amont pour
+        toutes les questions à la fois. Les appels sont de basse priorité
+        face au chat. Les erreurs sont propagées afin que l'appelant puisse
+        réessayer.
+        """
+        if not docs:
+            return "Aucune information pertinente trouvée."
+        chain = ChatManager.build_chain(question)
+        requests, tokens = ChatManager.estimate_cost(question, docs)
+        lease_id = await asyncio.to_thread(scheduler.acquire, session_id, BACKGROUND, tokens, requests)
+        try:
+            return await chain.arun(input_documents=docs, question=question)
+        finally:
+            await asyncio.to_thread(scheduler.release, lease_id)
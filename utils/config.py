@@ -7,12 +7,67 @@ class Config:
     PAGE_ICON = "🤖"
     MAX_FILE_SIZE = 10_000_000  # 10MB
     DEFAULT_CONVERSATION_NAME = "Nouvelle conversation"
-    
+
+    # Stockage partagé entre l'interface Streamlit et l'API
+    UPLOAD_DIR = "temp_pdfs"
+    DATA_DIR = os.environ.get("DOCUMIND_DATA_DIR", "data")
+    INDEX_DIR = os.path.join(DATA_DIR, "indexes")
+    ARTIFACT_DIR = os.path.join(DATA_DIR, "artifacts")
+    SEARCH_DB = os.path.join(DATA_DIR, "search.db")
+    SCHEDULER_DB = os.path.join(DATA_DIR, "scheduler.db")
+    PARTIAL_UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+    UPLOAD_SESSION_TTL = 24 * 3600  # secondes sans nouveau morceau avant expiration d'un upload
+    INGEST_RETRY_DELAY = 300  # secondes avant un nouvel essai d'un document en échec
+
+    # OCR des pages scannées (pytesseract + pdf2image)
+    OCR_CACHE_DIR = os.path.join(DATA_DIR, "ocr")
+    OCR_LANG = "fra+eng"
+    OCR_DPI = 300
+    # Taille du pool d'OCR partagé par processus (API : un pool par worker uvicorn)
+    OCR_WORKERS = int(os.environ.get("DOCUMIND_OCR_WORKERS", max(1, min(4, (os.cpu_count() or 2) // 2))))
+    CONVERSATIONS_FILE = "conversations.json"
+
+    # Modèles et paramètres de recherche
+    CHAT_MODEL = "gpt-3.5-turbo"
+    EMBEDDING_MODEL = "text-embedding-3-small"  # Plus rapide et économique
+    CHUNK_SIZE = 1000
+    CHUNK_OVERLAP = 200
+    RETRIEVAL_K = 5
+
+    # Routage des questions vers les documents pertinents
+    ROUTING_MIN_DOCUMENTS = 5  # en dessous, recherche dans l'index fusionné
+    ROUTING_TOP_DOCUMENTS = 3
+    ROUTING_KEYWORDS = 50
+    ROUTING_KEYWORD_WEIGHT = 0.1
+    ROUTING_SHARD_CACHE = 64  # index de documents gardés en mémoire par processus
+
+    # Re-ranking des passages (second tri après la recherche vectorielle)
+    RERANK_ENABLED = os.environ.get("DOCUMIND_RERANK", "0") == "1"
+    RERANK_METHOD = "lexical"  # ou "cross-encoder" (sentence-transformers)
+    RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # multilingue
+    RERANK_CANDIDATES = 20
+    RERANK_BATCH_SIZE = 8
+    RERANK_BUDGET_MS = 150
+
+    # Ordonnancement des appels OpenAI (budgets du compte, partagés par tous les processus)
+    SCHEDULER_REQUESTS_PER_MINUTE = int(os.environ.get("DOCUMIND_RPM", 500))
+    SCHEDULER_TOKENS_PER_MINUTE = int(os.environ.get("DOCUMIND_TPM", 200_000))
+    SCHEDULER_MAX_CONCURRENT = int(os.environ.get("DOCUMIND_MAX_CONCURRENT", 8))
+    SCHEDULER_MAX_WAIT = 30  # secondes avant qu'une tâche de fond passe devant
+    EMBEDDING_BATCH_SIZE = 100  # passages par appel d'embeddings
+    ANSWER_TOKENS = 512  # réserve pour la réponse du LLM
+
     @staticmethod
     def get_openai_key():
+        # La variable d'environnement permet d'utiliser l'API sans Streamlit
+        if os.environ.get("OPENAI_API_KEY"):
+            return os.environ["OPENAI_API_KEY"]
         try:
             return st.secrets["OPENAI_API_KEY"]
         except Exception as e:
             st.error(f"Erreur de configuration : {str(e)}")
             st.error("Veuillez configurer votre clé API dans le fichier .streamlit/secrets.toml")
-            st.stop()
\ No newline at end of file
+            st.stop()
+            # Hors de Streamlit, st.stop() ne lève pas d'exception
+            raise RuntimeError("Clé API OpenAI introuvable (OPENAI_API_KEY)")
@@ -0,0 +1,186 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+from utils.config import Config
+from utils.artifact_cache import ArtifactCache
+
+WORD_PATTERN = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5(
+    content,
+    kind UNINDEXED,
+    conversation_id UNINDEXED,
+    document_id UNINDEXED,
+    page UNINDEXED,
+    timestamp UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS links (
+    conversation_id TEXT,
+    document_id TEXT,
+    name TEXT,
+    PRIMARY KEY (conversation_id, document_id)
+);
+"""
+
+
+class GlobalSearch:
+    """
+    Index plein texte de tous les documents et de tous les messages
+
+    Index SQLite FTS5 sur disque, mis à jour à chaque ingestion et à chaque
+    message : une recherche ne charge aucun index FAISS et répond en
+    quelques millisecondes. Les passages d'un document sont indexés une
+    seule fois, quel que soit le nombre de conversations qui le contiennent.
+    """
+
+    _initialized = False
+
+    @staticmethod
+    def _connect():
+        os.makedirs(os.path.dirname(Config.SEARCH_DB), exist_ok=True)
+        conn = sqlite3.connect(Config.SEARCH_DB, timeout=10)
+        if not GlobalSearch._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")  # Lectures concurrentes des workers
+            # Transaction exclusive : un seul worker crée et remplit l'index
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone():
+                GlobalSearch._backfill(conn)
+                conn.execute("INSERT INTO meta (key) VALUES ('backfilled')")
+            conn.commit()
+            GlobalSearch._initialized = True
+        return conn
+
+    @staticmethod
+    def _backfill(conn):
+        """Indexe l'historique existant lors de la création de l'index"""
+        from utils.storage import ConversationStorage
+
+        for conv_id, conv in ConversationStorage.read_all().items():
+            for message in conv.get("messages", []):
+                GlobalSearch._insert_message(conn, conv_id, message)
+            for doc in conv.get("documents", []):
+                if doc.get("id"):
+                    GlobalSearch._insert_link(conn, conv_id, doc)
+                    GlobalSearch._insert_chunks(conn, doc["id"])
+
+    @staticmethod
+    def _insert_message(conn, conv_id, message):
+        conn.execute(
+            "INSERT INTO entries (content, kind, conversation_id, timestamp) VALUES (?, 'message', ?, ?)",
+            (message["content"], conv_id, str(message["timestamp"]))
+        )
+
+    @staticmethod
+    def _insert_link(conn, conv_id, doc):
+        conn.execute(
+            "INSERT OR IGNORE INTO links (conversation_id, document_id, name) VALUES (?, ?, ?)",
+            (conv_id, doc["id"], doc["name"])
+        )
+
+    @staticmethod
+    def _insert_chunks(conn, doc_id):
+        if conn.execute("SELECT 1 FROM documents WHERE document_id = ?", (doc_id,)).fetchone():
+            return
+        chunks_key = ArtifactCache.chunks_key(doc_id)
+        chunks = ArtifactCache.load("chunks", chunks_key) if chunks_key else None
+        if chunks is None:
+            return
+        conn.executemany(
+            "INSERT INTO entries (content, kind, document_id, page) VALUES (?, 'document', ?, ?)",
+            [(chunk["text"], doc_id, chunk["page"]) for chunk in chunks]
+        )
+        conn.execute("INSERT INTO documents (document_id) VALUES (?)", (doc_id,))
+
+    @staticmethod
+    def index_message(conv_id, message):
+        """Ajoute un message à l'index"""
+        with closing(GlobalSearch._connect()) as conn, conn:
+            GlobalSearch._insert_message(conn, conv_id, message)
+
+    @staticmethod
+    def index_document(doc_id):
+        """Ajoute les passages d'un document indexé (sans effet s'il l'est déjà)"""
+        with closing(GlobalSearch._connect()) as conn, conn:
+            GlobalSearch._insert_chunks(conn, doc_id)
+
+    @staticmethod
+    def link_document(conv_id, doc):
+        """Rattache un document à une conversation"""
+        with closing(GlobalSearch._connect()) as conn, conn:
+            GlobalSearch._insert_link(conn, conv_id, doc)
+
+    @staticmethod
+    def unlink_document(conv_id, doc_id):
+        """Détache un document d'une conversation"""
+        with closing(GlobalSearch._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM links WHERE conversation_id = ? AND document_id = ?",
+                (conv_id, doc_id)
+            )
+
+    @staticmethod
+    def remove_conversation(conv_id):
+        """Retire les messages et les rattachements d'une conversation supprimée"""
+        with closing(GlobalSearch._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries WHERE kind = 'message' AND conversation_id = ?", (conv_id,))
+            conn.execute("DELETE FROM links WHERE conversation_id = ?", (conv_id,))
+
+    @staticmethod
+    def search(query, limit=20):
+        """
+        Recherche dans tous les documents et toutes les conversations
+
+        Args:
+            query (str): Mots recherchés (tous doivent apparaître)
+            limit (int): Nombre maximum de résultats
+
+        Returns:
+            list[dict]: Résultats classés par pertinence (BM25). Les messages
+            indiquent leur conversation, les passages leur document, leur page
+            et les conversations qui contiennent ce document.
+        """
+        # Chaque mot entre guillemets : pas d'interprétation de la syntaxe FTS5
+        terms = WORD_PATTERN.findall(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"' for term in terms)
+
+        with closing(GlobalSearch._connect()) as conn:
+            rows = conn.execute(
+                "SELECT kind, conversation_id, document_id, page, timestamp, "
+                "snippet(entries, 0, '**', '**', '…', 16), bm25(entries) AS score "
+                "FROM entries WHERE entries MATCH ? ORDER BY score LIMIT ?",
+                (match, limit)
+            ).fetchall()
+
+            doc_ids = {row[2] for row in rows if row[0] == "document"}
+            references = {}
+            if doc_ids:
+                placeholders = ",".join("?" * len(doc_ids))
+                for conv_id, doc_id, name in conn.execute(
+                    f"SELECT conversation_id, document_id, name FROM links WHERE document_id IN ({placeholders})",
+                    tuple(doc_ids)
+                ):
+                    references.setdefault(doc_id, []).append({"conversation_id": conv_id, "name": name})
+
+        results = []
+        for kind, conv_id, doc_id, page, timestamp, snippet, score in rows:
+            hit = {"kind": kind, "snippet": snippet, "score": -score}
+            if kind == "message":
+                hit.update(conversation_id=conv_id, timestamp=timestamp)
+            else:
+                hit.update(document_id=doc_id, page=page, references=references.get(doc_id, []))
+            results.append(hit)
+        return results
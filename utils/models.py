@@ -0,0 +1,92 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from operator import itemgetter
+from typing import NamedTuple, Optional
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = NAIVE_EPOCH.toordinal()
+MICROSECOND = timedelta(microseconds=1)
+
+
+class Message(NamedTuple):
+    """
+    Message d'une conversation, en représentation compacte
+
+    Un tuple par message, sans dictionnaire par instance. Les rôles sont
+    internés (une seule chaîne "user" ou "ai" en mémoire) et l'horodatage
+    est converti une seule fois, au chargement, en entier : microsecondes
+    depuis l'epoch et décalage UTC d'origine. Une heure enregistrée sans
+    fuseau (datetime.now() des anciennes versions) est comptée telle
+    quelle, avec un décalage None : elle est restituée à l'identique, quel
+    que soit le fuseau du serveur.
+    """
+    role: str
+    content: str
+    timestamp: int  # Microsecondes depuis l'epoch (UTC, ou heure locale si utc_offset est None)
+    utc_offset: Optional[int]  # Secondes, None si l'heure enregistrée est sans fuseau
+
+    @staticmethod
+    def now(role, content):
+        """Nouveau message, horodaté à l'heure locale avec son fuseau"""
+        return Message.from_dict({"role": role, "content": content, "timestamp": datetime.now().astimezone().isoformat()})
+
+    @staticmethod
+    def from_dict(data):
+        return Message.from_dicts([data])[0]
+
+    @staticmethod
+    def from_dicts(items):
+        """Construction en masse : seul l'horodatage passe par du code Python"""
+        roles = map(sys.intern, map(_role, items))
+        contents = map(_content, items)
+        stamps = list(map(_parse_timestamp, map(_timestamp, items)))
+        return list(map(_new_message, zip(roles, contents, map(_first, stamps), map(_second, stamps))))
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.sent_at.isoformat()
+        }
+
+    @property
+    def clock(self):
+        """Heure d'envoi HH:MM dans le fuseau d'origine (affichage du chat)"""
+        minutes = (self.timestamp // 60_000_000 + (self.utc_offset or 0) // 60) % 1440
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    @property
+    def sent_at(self):
+        """Instant d'envoi dans le fuseau d'origine (calcul entier, sans analyse de texte)"""
+        if self.utc_offset is None:
+            return NAIVE_EPOCH + self.timestamp * MICROSECOND
+        return (EPOCH + self.timestamp * MICROSECOND).astimezone(timezone(timedelta(seconds=self.utc_offset)))
+
+
+def _parse_timestamp(text):
+    """(microsecondes depuis l'epoch, décalage UTC en secondes ou None)"""
+    try:
+        sent_at = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        # Horodatage illisible : heure de chargement
+        sent_at = datetime.now()
+    # Arithmétique entière : plus rapide qu'une division de timedelta
+    wall_clock = (
+        ((sent_at.toordinal() - EPOCH_ORDINAL) * 86400 + sent_at.hour * 3600 + sent_at.minute * 60 + sent_at.second)
+        * 1_000_000 + sent_at.microsecond
+    )
+    offset = sent_at.utcoffset()
+    if offset is None:
+        return wall_clock, None
+    offset = offset.days * 86400 + offset.seconds
+    return wall_clock - offset * 1_000_000, offset
+
+
+_role = itemgetter("role")
+_content = itemgetter("content")
+_timestamp = itemgetter("timestamp")
+_first = itemgetter(0)
+_second = itemgetter(1)
+_new_message = partial(tuple.__new__, Message)
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.config import Config
+
+# Dépendances optionnelles : nécessitent aussi les binaires tesseract et poppler
+try:
+    import pytesseract
+    from pdf2image import convert_from_path
+    OCR_AVAILABLE = all(
+        shutil.which(command)
+        for command in (pytesseract.pytesseract.tesseract_cmd, "pdftoppm", "pdfinfo")
+    )
+except ImportError:
+    OCR_AVAILABLE = False
+
+
+def _ocr_page(file_path, page_number):
+    """Rend une page en image et la passe à tesseract (exécuté dans un processus du pool)"""
+    images = convert_from_path(
+        file_path,
+        dpi=Config.OCR_DPI,
+        first_page=page_number + 1,
+        last_page=page_number + 1
+    )
+    return "\n".join(pytesseract.image_to_string(image, lang=Config.OCR_LANG) for image in images)
+
+
+class OCRProcessor:
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    @staticmethod
+    def _get_pool():
+        """
+        Pool de processus partagé par toutes les ingestions du processus
+
+        Démarrage en spawn : Streamlit et FastAPI appellent l'OCR depuis des
+        threads, et un fork d'un processus multi-thread peut bloquer l'enfant.
+        """
+        with OCRProcessor._pool_lock:
+            if OCRProcessor._pool is None:
+                OCRProcessor._pool = ProcessPoolExecutor(
+                    max_workers=Config.OCR_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return OCRProcessor._pool
+
+    @staticmethod
+    def _reset_pool(pool):
+        """Abandonne un pool dont un processus s'est arrêté brutalement"""
+        with OCRProcessor._pool_lock:
+            if OCRProcessor._pool is pool:
+                OCRProcessor._pool = None
+        pool.shutdown(wait=False)
+
+    @staticmethod
+    def _cache_path(doc_hash, page_number):
+        return os.path.join(Config.OCR_CACHE_DIR, doc_hash, Config.OCR_LANG, f"{page_number}.txt")
+
+    @staticmethod
+    def ocr_pages(file_path, doc_hash, page_numbers):
+        """
+        Reconnaît le texte des pages sans couche texte
+
+        Les pages sont traitées en parallèle dans le pool de processus
+        partagé (Config.OCR_WORKERS processus au plus) et le résultat est
+        mis en cache par (hash du document, langue, page) : un même document
+        n'est jamais passé deux fois à l'OCR.
+
+        Args:
+            file_path (str): Chemin vers le fichier PDF
+            doc_hash (str): Hash du contenu du document
+            page_numbers (list[int]): Pages à traiter (numérotées à partir de 0)
+
+        Returns:
+            dict[int, str]: Texte reconnu par page (vide si l'OCR est indisponible)
+
+        Raises:
+            RuntimeError: Échec de l'OCR d'une page (les pages déjà reconnues
+            restent en cache : un nouvel essai ne traite que les suivantes)
+        """
+        if not OCR_AVAILABLE or not page_numbers:
+            return {}
+
+        results = {}
+        missing = []
+        for page_number in page_numbers:
+            try:
+                with open(OCRProcessor._cache_path(doc_hash, page_number), encoding="utf-8") as f:
+                    results[page_number] = f.read()
+            except FileNotFoundError:
+                missing.append(page_number)
+
+        if missing:
+            os.makedirs(os.path.dirname(OCRProcessor._cache_path(doc_hash, 0)), exist_ok=True)
+            pool = OCRProcessor._get_pool()
+            try:
+                texts = pool.map(_ocr_page, [file_path] * len(missing), missing)
+                for page_number, text in zip(missing, texts):
+                    results[page_number] = text
+                    with open(OCRProcessor._cache_path(doc_hash, page_number), "w", encoding="utf-8") as f:
+                        f.write(text)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    OCRProcessor._reset_pool(pool)
+                # Pas de résultat partiel : les pages manquantes seraient perdues
+                # pour l'index et la recherche
+                raise RuntimeError(f"OCR impossible pour {os.path.basename(file_path)} : {e}") from e
+
+        return results
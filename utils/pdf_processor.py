@@ -1,3 +1,5 @@
+import hashlib
+import mmap
 import os
 from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -5,72 +7,176 @@ from langchain.embeddings import OpenAIEmbeddings
 #from langchain.vectorstores import FAISS
 from langchain_community.vectorstores import FAISS
 
-import streamlit as st
 from utils.config import Config
+from utils.ocr import OCRProcessor, OCR_AVAILABLE
+from utils.artifact_cache import ArtifactCache
+from utils.scheduler import scheduler, Scheduler, BACKGROUND
 
 class PDFProcessor:
     @staticmethod
-    @st.cache_resource(show_spinner=False, max_entries=5)
-    def process_pdf(file_path):
+    def compute_hash(file_path):
+        """Hash SHA-256 du contenu d'un fichier, lu par blocs"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(Config.UPLOAD_CHUNK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def extract_pages(file_path, doc_hash=None):
         """
-        Traite un fichier PDF et retourne un vector store FAISS
-        
+        Extrait le texte de chaque page d'un fichier PDF
+
+        Les pages sans couche texte (scans, images) passent par l'OCR ; les
+        autres n'en paient pas le coût.
+
         Args:
             file_path (str): Chemin vers le fichier PDF
-            
+            doc_hash (str): Hash du contenu, calculé si absent (clé du cache OCR)
+
         Returns:
-            FAISS: Vector store contenant les embeddings du PDF
-            None: En cas d'erreur
+            list[str]: Texte de chaque page, dans l'ordre
+
+        Raises:
+            ValueError: Fichier introuvable, vide ou sans texte
+            RuntimeError: Échec de l'OCR d'une page sans texte
         """
-        try:
-            # Validation du fichier
-            if not isinstance(file_path, str):
-                raise ValueError("Le chemin du fichier doit être une chaîne de caractères")
-                
-            if not os.path.isfile(file_path):
-                raise ValueError(f"Fichier {file_path} introuvable")
-                
-            # Extraction du texte
-            with st.spinner(f"Extraction du texte depuis {os.path.basename(file_path)}..."):
-                with open(file_path, "rb") as f:
-                    pdf_reader = PdfReader(f)
-                    
-                    if not pdf_reader.pages:
-                        raise ValueError("PDF vide ou corrompu")
-                        
-                    text = "\n".join(
-                        page.extract_text() or "" 
-                        for page in pdf_reader.pages
-                    )
-                    
-            if not text.strip():
-                raise ValueError("Aucun texte extrait - le PDF est peut-être une image scannée")
-                
-            # Découpage du texte
-            text_splitter = RecursiveCharacterTextSplitter(
-                separators=["\n\n", "\n", ".", " "],
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len
-            )
-            chunks = text_splitter.split_text(text)
-            
-            # Création des embeddings
-            with st.spinner("Création des embeddings..."):
-                embeddings = OpenAIEmbeddings(
-                    openai_api_key=Config.get_openai_key(),
-                    model="text-embedding-3-small"  # Plus rapide et économique
-                )
-                vector_store = FAISS.from_texts(
-                    chunks, 
-                    embeddings,
-                    metadatas=[{"source": file_path} for _ in chunks]
+        if not isinstance(file_path, str):
+            raise ValueError("Le chemin du fichier doit être une chaîne de caractères")
+
+        if not os.path.isfile(file_path):
+            raise ValueError(f"Fichier {file_path} introuvable")
+
+        if os.path.getsize(file_path) == 0:
+            raise ValueError("PDF vide ou corrompu")
+
+        # Lecture via un buffer mappé en mémoire : le système pagine le fichier
+        # au lieu d'en garder des copies en mémoire
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            pdf_reader = PdfReader(buffer)
+
+            if not pdf_reader.pages:
+                raise ValueError("PDF vide ou corrompu")
+
+            pages = [page.extract_text() or "" for page in pdf_reader.pages]
+
+        # OCR uniquement sur les pages sans texte
+        empty_pages = [i for i, text in enumerate(pages) if not text.strip()]
+        if empty_pages and OCR_AVAILABLE:
+            doc_hash = doc_hash or PDFProcessor.compute_hash(file_path)
+            for page_number, text in OCRProcessor.ocr_pages(file_path, doc_hash, empty_pages).items():
+                pages[page_number] = text
+
+        if not any(text.strip() for text in pages):
+            if not OCR_AVAILABLE:
+                raise ValueError(
+                    "Aucun texte extrait - le PDF est peut-être une image scannée "
+                    "(OCR indisponible : installez pytesseract et pdf2image)"
                 )
-                
-            return vector_store
-            
-        except Exception as e:
-            st.error(f"Erreur lors du traitement du PDF: {str(e)}")
-            # Nettoyer le cache en cas d'erreur
-            st.cache_resource.clear()
-            return None
\ No newline at end of file
+            raise ValueError("Aucun texte extrait - le PDF est peut-être une image scannée")
+
+        return pages
+
+    @staticmethod
+    def split_text(text):
+        """Découpe le texte en passages pour l'indexation"""
+        text_splitter = RecursiveCharacterTextSplitter(
+            separators=["\n\n", "\n", ".", " "],
+            chunk_size=Config.CHUNK_SIZE,
+            chunk_overlap=Config.CHUNK_OVERLAP,
+            length_function=len
+        )
+        return text_splitter.split_text(text)
+
+    @staticmethod
+    def get_embeddings():
+        """Retourne le modèle d'embeddings partagé par l'indexation et le chargement"""
+        return OpenAIEmbeddings(
+            openai_api_key=Config.get_openai_key(),
+            model=Config.EMBEDDING_MODEL
+        )
+
+    @staticmethod
+    def split_pages(pages):
+        """Découpe chaque page en passages en conservant leur numéro de page"""
+        return [
+            {"text": chunk, "page": page_number}
+            for page_number, text in enumerate(pages, start=1)
+            for chunk in PDFProcessor.split_text(text)
+        ]
+
+    @staticmethod
+    def build_vector_store(chunks, file_path, doc_hash, session_id=None):
+        """
+        Crée un vector store FAISS à partir des passages d'un document
+
+        Les embeddings sont demandés par lots de basse priorité : les
+        questions du chat peuvent passer entre deux lots d'une grosse ingestion.
+        """
+        embeddings = PDFProcessor.get_embeddings()
+        texts = [chunk["text"] for chunk in chunks]
+        vectors = []
+        for start in range(0, len(texts), Config.EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + Config.EMBEDDING_BATCH_SIZE]
+            with scheduler.slot(session_id, BACKGROUND, Scheduler.estimate_tokens(*batch)):
+                vectors.extend(embeddings.embed_documents(batch))
+
+        return FAISS.from_embeddings(
+            list(zip(texts, vectors)),
+            embeddings,
+            metadatas=[
+                {"source": file_path, "document_id": doc_hash, "page": chunk["page"]}
+                for chunk in chunks
+            ]
+        )
+
+    @staticmethod
+    def build_index(file_path, doc_hash=None, session_id=None):
+        """
+        Calcule l'index FAISS d'un document en réutilisant les étapes en cache
+
+        Args:
+            file_path (str): Chemin vers le fichier PDF
+            doc_hash (str): Hash du contenu, calculé si absent
+            session_id (str): Session à l'origine de l'ingestion (ordonnancement)
+
+        Returns:
+            str: Dossier de l'index FAISS persisté
+
+        Raises:
+            ValueError: Fichier introuvable, vide ou sans texte
+        """
+        if not os.path.isfile(str(file_path)):
+            raise ValueError(f"Fichier {file_path} introuvable")
+        doc_hash = doc_hash or PDFProcessor.compute_hash(file_path)
+
+        pages = ArtifactCache.load("pages", ArtifactCache.find_pages_key(doc_hash))
+        if pages is None:
+            pages = PDFProcessor.extract_pages(file_path, doc_hash)
+            # Pages sans texte laissées vides faute d'OCR : clé distincte, reprise
+            # par le premier processus qui dispose de l'OCR
+            complete = OCR_AVAILABLE or all(text.strip() for text in pages)
+            ArtifactCache.save("pages", ArtifactCache.pages_key(doc_hash, ocr=complete), pages)
+
+        index_path = ArtifactCache.path("embeddings", ArtifactCache.embeddings_key(doc_hash))
+        if os.path.isdir(index_path):
+            return index_path
+
+        chunks = ArtifactCache.get_or_compute(
+            "chunks",
+            ArtifactCache.chunks_key(doc_hash),
+            lambda: PDFProcessor.split_pages(pages)
+        )
+        vector_store = PDFProcessor.build_vector_store(chunks, file_path, doc_hash, session_id)
+        ArtifactCache.save_directory(index_path, vector_store.save_local)
+        return index_path
+
+    @staticmethod
+    def load_index(index_path):
+        """Charge un index FAISS persisté"""
+        embeddings = PDFProcessor.get_embeddings()
+        try:
+            return FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+        except TypeError:
+            # Versions de langchain_community antérieures à ce paramètre
+            return FAISS.load_local(index_path, embeddings)
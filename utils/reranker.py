@@ -0,0 +1,121 @@
+import re
+import time
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from utils.config import Config
+
+# Dépendance optionnelle pour le re-ranking par cross-encoder
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    CROSS_ENCODER_AVAILABLE = False
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class Reranker:
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+
+    @staticmethod
+    def tokenize(text):
+        """Mots en minuscules et sans accents, en ignorant les mots de moins de 3 lettres"""
+        text = unicodedata.normalize("NFKD", text.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        return [word for word in WORD_PATTERN.findall(text) if len(word) > 2]
+
+    @staticmethod
+    def lexical_scores(question, texts):
+        """
+        Score BM25 des passages candidats pour la question
+
+        Les statistiques (idf, longueur moyenne) sont calculées sur les seuls
+        candidats, et le score est calculé en une opération matricielle.
+
+        Returns:
+            np.ndarray: Un score par passage
+        """
+        terms = list(dict.fromkeys(Reranker.tokenize(question)))
+        if not terms or not texts:
+            return np.zeros(len(texts))
+
+        counts = [Counter(Reranker.tokenize(text)) for text in texts]
+        tf = np.array([[c[term] for term in terms] for c in counts], dtype=np.float32)
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+
+        n_docs = len(texts)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        norm = Reranker.BM25_K1 * (1 - Reranker.BM25_B + Reranker.BM25_B * lengths / max(lengths.mean(), 1))
+        weights = tf * (Reranker.BM25_K1 + 1) / (tf + norm[:, None])
+        return weights @ idf
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _cross_encoder():
+        return CrossEncoder(Config.RERANK_MODEL, device="cpu")
+
+    @staticmethod
+    def warm_up(method=None):
+        """Charge le modèle du cross-encoder (sans effet pour la méthode lexicale)"""
+        if (method or Config.RERANK_METHOD) == "cross-encoder" and CROSS_ENCODER_AVAILABLE:
+            Reranker._cross_encoder()
+
+    @staticmethod
+    def cross_encoder_scores(question, texts):
+        """Score de pertinence (question, passage) calculé par le cross-encoder local"""
+        return np.asarray(Reranker._cross_encoder().predict([(question, text) for text in texts]))
+
+    @staticmethod
+    def rerank(question, docs, top_k, budget_ms=None, method=None):
+        """
+        Réordonne des passages candidats et garde les meilleurs
+
+        Les candidats sont évalués par lots dans l'ordre de la recherche
+        vectorielle. Le budget est vérifié avant chaque lot : un lot qui ne
+        tiendrait plus dans le budget n'est pas lancé, les candidats déjà
+        évalués sont re-classés et les autres suivent dans l'ordre vectoriel.
+        Le chargement du modèle n'est pas compté dans le budget.
+
+        Args:
+            question (str): Question posée
+            docs (list[Document]): Candidats, dans l'ordre de la recherche vectorielle
+            top_k (int): Nombre de passages à conserver
+            budget_ms (float): Temps maximum alloué (Config.RERANK_BUDGET_MS par défaut)
+            method (str): "lexical" ou "cross-encoder" (Config.RERANK_METHOD par défaut)
+
+        Returns:
+            list[Document]: Les top_k passages retenus
+        """
+        budget_ms = Config.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+        method = method or Config.RERANK_METHOD
+        if len(docs) <= 1:
+            return docs[:top_k]
+
+        texts = [doc.page_content for doc in docs]
+        if method == "cross-encoder" and CROSS_ENCODER_AVAILABLE:
+            Reranker.warm_up(method)
+            score_batch = Reranker.cross_encoder_scores
+            batch_size = Config.RERANK_BATCH_SIZE
+        else:
+            # Les statistiques BM25 portent sur l'ensemble des candidats : un seul lot
+            score_batch = Reranker.lexical_scores
+            batch_size = len(texts)
+
+        deadline = time.perf_counter() + budget_ms / 1000
+        scores = []
+        batch_duration = 0.0
+        for start in range(0, len(texts), batch_size):
+            if scores and time.perf_counter() + batch_duration > deadline:
+                # Le lot suivant dépasserait le budget : on garde ce qui est évalué
+                break
+            batch_start = time.perf_counter()
+            scores.extend(score_batch(question, texts[start:start + batch_size]))
+            batch_duration = time.perf_counter() - batch_start
+
+        # Tri stable : à score égal, l'ordre vectoriel départage
+        order = sorted(range(len(scores)), key=lambda i: -scores[i]) + list(range(len(scores), len(docs)))
+        return [docs[i] for i in order[:top_k]]
@@ -0,0 +1,127 @@
+import math
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from utils.config import Config
+from utils.artifact_cache import ArtifactCache
+from utils.pdf_processor import PDFProcessor
+from utils.reranker import Reranker
+
+
+class DocumentRouter:
+    """
+    Routage des questions vers les documents pertinents
+
+    Chaque document a un profil calculé à l'ingestion : vecteur résumé
+    (moyenne normalisée des embeddings de ses passages) et mots-clés
+    (fréquences des mots les plus présents). Une question est d'abord
+    comparée aux profils, puis la recherche de passages n'a lieu que dans
+    l'index des documents retenus.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=Config.ROUTING_SHARD_CACHE)
+    def _shard(index_path):
+        return PDFProcessor.load_index(index_path)
+
+    @staticmethod
+    def shard(doc_id):
+        """Index FAISS d'un seul document (mis en cache par processus)"""
+        return DocumentRouter._shard(ArtifactCache.path("embeddings", ArtifactCache.embeddings_key(doc_id)))
+
+    @staticmethod
+    def _build_profile(doc_id):
+        index = DocumentRouter.shard(doc_id).index
+        centroid = index.reconstruct_n(0, index.ntotal).mean(axis=0)
+        centroid /= max(np.linalg.norm(centroid), 1e-12)
+
+        chunks = ArtifactCache.load("chunks", ArtifactCache.chunks_key(doc_id)) or []
+        counts = Counter(word for chunk in chunks for word in Reranker.tokenize(chunk["text"]))
+        total = sum(counts.values()) or 1
+        keywords = {word: count / total for word, count in counts.most_common(Config.ROUTING_KEYWORDS)}
+        return {"vector": centroid.tolist(), "keywords": keywords}
+
+    @staticmethod
+    def profile(doc_id):
+        """Profil de routage d'un document indexé, calculé une seule fois"""
+        return ArtifactCache.get_or_compute(
+            "profiles",
+            ArtifactCache.embeddings_key(doc_id),
+            lambda: DocumentRouter._build_profile(doc_id)
+        )
+
+    @staticmethod
+    def keyword_scores(question, keyword_profiles):
+        """
+        Score mots-clés de chaque document pour la question
+
+        Les mots présents dans tous les profils (mots courants) pèsent peu :
+        pondération idf calculée sur les documents de la conversation.
+        """
+        terms = set(Reranker.tokenize(question))
+        n_docs = len(keyword_profiles)
+        idf = {
+            term: math.log(1 + n_docs / (1 + sum(term in profile for profile in keyword_profiles)))
+            for term in terms
+        }
+        scores = np.array([
+            sum(profile.get(term, 0.0) * idf[term] for term in terms)
+            for profile in keyword_profiles
+        ], dtype=np.float32)
+        return scores / scores.max() if scores.max() > 0 else scores
+
+    @staticmethod
+    def rank_documents(query_vector, summary_vectors, keyword_scores=None):
+        """
+        Classe les documents pour une question
+
+        Args:
+            query_vector: Embedding de la question
+            summary_vectors: Vecteurs résumés normalisés (une ligne par document)
+            keyword_scores: Scores mots-clés normalisés entre 0 et 1 (optionnel)
+
+        Returns:
+            np.ndarray: Indices des documents, du plus au moins pertinent
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = summary_vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        if keyword_scores is not None:
+            scores = scores + Config.ROUTING_KEYWORD_WEIGHT * keyword_scores
+        return np.argsort(-scores, kind="stable")
+
+
+class RoutedStore:
+    """
+    Vector store d'une conversation à nombreux documents
+
+    Même interface de recherche que le FAISS fusionné utilisé par
+    ChatManager : seuls les ROUTING_TOP_DOCUMENTS documents les plus proches
+    de la question sont interrogés, puis leurs résultats sont fusionnés par
+    distance.
+    """
+
+    def __init__(self, doc_ids):
+        self.doc_ids = list(doc_ids)
+        profiles = [DocumentRouter.profile(doc_id) for doc_id in self.doc_ids]
+        self.summary_vectors = np.array([profile["vector"] for profile in profiles], dtype=np.float32)
+        self.keyword_profiles = [profile["keywords"] for profile in profiles]
+        self.embeddings = PDFProcessor.get_embeddings()
+
+    def route(self, query, query_vector):
+        """Identifiants des documents dans lesquels chercher"""
+        order = DocumentRouter.rank_documents(
+            query_vector,
+            self.summary_vectors,
+            DocumentRouter.keyword_scores(query, self.keyword_profiles)
+        )
+        return [self.doc_ids[i] for i in order[:Config.ROUTING_TOP_DOCUMENTS]]
+
+    def similarity_search(self, query, k=4):
+        query_vector = self.embeddings.embed_query(query)
+        results = []
+        for doc_id in self.route(query, query_vector):
+            results.extend(DocumentRouter.shard(doc_id).similarity_search_with_score_by_vector(query_vector, k=k))
+
+        # Distances L2 comparables d'un index à l'autre (même modèle d'embeddings)
+        results.sort(key=lambda result: result[1])
+        return [doc for doc, _ in results[:k]]
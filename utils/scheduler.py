@@ -0,0 +1,257 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import closing, contextmanager
+from utils.config import Config
+
+INTERACTIVE = 0  # Questions posées dans le chat
+BACKGROUND = 1   # Ingestion, traitements batch
+
+POLL_INTERVAL = 0.25  # Les libérations des autres processus ne sont pas notifiées
+STALE_WAITER = 10     # Secondes sans nouvelles d'un appel en attente (processus arrêté)
+LEASE_TIMEOUT = 600   # Durée maximale d'un appel admis dont la libération a été perdue
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    level REAL,
+    refilled_at REAL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id TEXT PRIMARY KEY,
+    session_id TEXT,
+    priority INTEGER,
+    enqueued_at REAL,
+    seen_at REAL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    id TEXT PRIMARY KEY,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    served_at REAL
+);
+"""
+
+
+class Scheduler:
+    """
+    Contrôle d'admission des appels aux API OpenAI (chat et embeddings)
+
+    Tous les appels passent par une même file, partagée par tous les
+    processus (workers de l'API, Streamlit, batch) au moyen d'une base
+    SQLite : budgets globaux de requêtes et de tokens par minute (seaux à
+    jetons), nombre maximum d'appels simultanés, priorité aux questions du
+    chat sur l'ingestion et tourniquet entre sessions à priorité égale. Une
+    requête de fond qui attend depuis plus de SCHEDULER_MAX_WAIT secondes
+    passe devant, pour ne jamais être affamée.
+
+    Les budgets sont donc ceux du compte OpenAI, quel que soit le nombre
+    de processus.
+    """
+
+    def __init__(self, db_path, requests_per_minute, tokens_per_minute, max_concurrent, max_wait):
+        self.db_path = db_path
+        self.request_budget = requests_per_minute
+        self.token_budget = tokens_per_minute
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+
+        # Réveil immédiat des appels de ce processus lors d'une libération locale
+        self._condition = threading.Condition()
+        self._initialized = False
+        self._waits = {INTERACTIVE: deque(maxlen=1000), BACKGROUND: deque(maxlen=1000)}
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Transaction exclusive : l'état des seaux est lu et modifié d'un bloc"""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _levels(self, conn, now):
+        """Niveau des seaux de requêtes et de tokens, remplis depuis la dernière admission"""
+        levels = []
+        for name, budget in (("requests", self.request_budget), ("tokens", self.token_budget)):
+            row = conn.execute("SELECT level, refilled_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                levels.append(float(budget))
+            else:
+                level, refilled_at = row
+                levels.append(min(budget, level + max(0.0, now - refilled_at) / 60 * budget))
+        return levels
+
+    def _next_waiter(self, conn, now):
+        """Prochain appel à servir : priorité, ancienneté puis tourniquet entre sessions"""
+        row = conn.execute(
+            "SELECT id FROM waiters WHERE priority = ? AND enqueued_at < ? ORDER BY enqueued_at LIMIT 1",
+            (BACKGROUND, now - self.max_wait)
+        ).fetchone()
+        if row is None:
+            # Session servie il y a le plus longtemps, puis appel le plus ancien de la session
+            row = conn.execute(
+                "SELECT w.id FROM waiters w LEFT JOIN sessions s ON s.session_id = w.session_id "
+                "ORDER BY w.priority, COALESCE(s.served_at, 0), w.enqueued_at LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def _budget_delay(self, conn, levels, requests, tokens):
+        """Secondes à attendre avant que le budget permette cet appel (0 si possible)"""
+        if conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0] >= self.max_concurrent:
+            return None  # Attente d'une libération
+        available_requests, available_tokens = levels
+        # Un appel plus gros que le budget total attend simplement un seau plein
+        requests = min(requests, self.request_budget)
+        tokens = min(tokens, self.token_budget)
+        missing_requests = max(0.0, requests - available_requests) / self.request_budget
+        missing_tokens = max(0.0, tokens - available_tokens) / self.token_budget
+        return max(missing_requests, missing_tokens) * 60
+
+    @staticmethod
+    def _enqueue(conn, waiter_id, session_id, priority, enqueued_at, seen_at):
+        conn.execute(
+            "INSERT INTO waiters (id, session_id, priority, enqueued_at, seen_at) VALUES (?, ?, ?, ?, ?)",
+            (waiter_id, session_id, priority, enqueued_at, seen_at)
+        )
+
+    def _try_admit(self, waiter_id, session_id, priority, enqueued_at, requests, tokens):
+        """Admet l'appel s'il est en tête de file et que le budget le permet ; sinon délai d'attente"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Appels abandonnés par un processus arrêté
+            conn.execute("DELETE FROM waiters WHERE seen_at < ?", (now - STALE_WAITER,))
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            if not conn.execute("UPDATE waiters SET seen_at = ? WHERE id = ?", (now, waiter_id)).rowcount:
+                # Retiré à tort (attente du verrou, horloge ajustée) : retour à sa place dans la file
+                self._enqueue(conn, waiter_id, session_id, priority, enqueued_at, now)
+
+            if self._next_waiter(conn, now) != waiter_id:
+                return POLL_INTERVAL
+            levels = self._levels(conn, now)
+            delay = self._budget_delay(conn, levels, requests, tokens)
+            if delay != 0:
+                return POLL_INTERVAL if delay is None else min(delay, POLL_INTERVAL)
+
+            # Admission : retrait de la file, la session passe en fin de tourniquet
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (name, level, refilled_at) VALUES (?, ?, ?)",
+                [
+                    ("requests", levels[0] - min(requests, self.request_budget), now),
+                    ("tokens", levels[1] - min(tokens, self.token_budget), now),
+                ]
+            )
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            conn.execute("INSERT INTO leases (id, expires_at) VALUES (?, ?)", (waiter_id, now + LEASE_TIMEOUT))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, served_at) VALUES (?, ?)", (session_id, now)
+            )
+            conn.execute("DELETE FROM sessions WHERE served_at < ?", (now - 3600,))
+            return 0
+
+    def acquire(self, session_id, priority, tokens, requests=1):
+        """
+        Bloque jusqu'à ce que l'appel soit admis
+
+        Returns:
+            str: Identifiant de l'appel, à passer à release
+        """
+        waiter_id = uuid.uuid4().hex
+        enqueued_at = time.time()
+        with self._transaction() as conn:
+            self._enqueue(conn, waiter_id, session_id, priority, enqueued_at, enqueued_at)
+        try:
+            while True:
+                delay = self._try_admit(waiter_id, session_id, priority, enqueued_at, requests, tokens)
+                if delay == 0:
+                    break
+                with self._condition:
+                    self._condition.wait(timeout=delay)
+        except BaseException:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            raise
+
+        self._waits[priority].append(time.time() - enqueued_at)
+        with self._condition:
+            self._condition.notify_all()  # La tête de file a changé
+        return waiter_id
+
+    def release(self, lease_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+        with self._condition:
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, session_id, priority, tokens, requests=1):
+        """
+        Réserve un appel pour la durée du bloc
+
+        Args:
+            session_id (str): Session (ou conversation) à l'origine de l'appel
+            priority (int): INTERACTIVE ou BACKGROUND
+            tokens (int): Estimation des tokens consommés
+            requests (int): Requêtes faites pendant le bloc (chaînes à plusieurs appels)
+        """
+        lease_id = self.acquire(session_id or "anonyme", priority, tokens, requests)
+        try:
+            yield
+        finally:
+            self.release(lease_id)
+
+    def stats(self):
+        """Profondeur des files et appels en cours (tous processus), temps d'attente de ce processus (ms)"""
+        with closing(self._connect()) as conn:
+            now = time.time()
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases WHERE expires_at >= ?", (now,)).fetchone()[0]
+            queues = {
+                priority: (depth, sessions)
+                for priority, depth, sessions in conn.execute(
+                    "SELECT priority, COUNT(*), COUNT(DISTINCT session_id) FROM waiters "
+                    "WHERE seen_at >= ? GROUP BY priority",
+                    (now - STALE_WAITER,)
+                )
+            }
+        stats = {"in_flight": in_flight, "queues": {}}
+        for priority, label in ((INTERACTIVE, "interactive"), (BACKGROUND, "background")):
+            waits = sorted(self._waits[priority])
+            depth, sessions = queues.get(priority, (0, 0))
+            stats["queues"][label] = {
+                "depth": depth,
+                "sessions": sessions,
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            }
+        return stats
+
+    @staticmethod
+    def estimate_tokens(*texts):
+        """Estimation grossière : environ 4 caractères par token"""
+        return sum(len(text) for text in texts) // 4 + 1
+
+
+scheduler = Scheduler(
+    db_path=Config.SCHEDULER_DB,
+    requests_per_minute=Config.SCHEDULER_REQUESTS_PER_MINUTE,
+    tokens_per_minute=Config.SCHEDULER_TOKENS_PER_MINUTE,
+    max_concurrent=Config.SCHEDULER_MAX_CONCURRENT,
+    max_wait=Config.SCHEDULER_MAX_WAIT
+)
@@ -0,0 +1,588 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from utils.config import Config
+from utils.artifact_cache import ArtifactCache
+from utils.pdf_processor import PDFProcessor
+from utils.chat_manager import ChatManager
+from utils.storage import ConversationStorage
+from utils.models import Message
+from utils.global_search import GlobalSearch
+from utils.router import DocumentRouter, RoutedStore
+
+
+class UploadWriter:
+    """
+    Écrit un flux sur disque par blocs en calculant son hash au passage
+
+    La taille est vérifiée à chaque bloc : un fichier trop gros est rejeté
+    dès que la limite est franchie, sans être lu en entier.
+    """
+
+    def __init__(self, path, limit, mode="wb"):
+        self.file = open(path, mode)
+        self.written = self.file.tell()
+        self.limit = limit
+        self.digest = hashlib.sha256()
+
+    def write(self, chunk):
+        if self.written + len(chunk) > self.limit:
+            raise ValueError(f"Fichier trop volumineux (limite : {self.limit // 1_000_000} Mo)")
+        self.digest.update(chunk)
+        self.file.write(chunk)
+        self.written += len(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class AssistantService:
+    """
+    Couche de service indépendante de Streamlit
+
+    Regroupe l'ingestion des documents, la persistance des index FAISS et
+    les questions-réponses. L'API HTTP (api.py) et l'interface Streamlit
+    (app.py) n'en sont que des clients : les index sont stockés sur disque,
+    identifiés par le hash du contenu, et partagés entre tous les workers.
+    """
+    INGEST_LOCK_TIMEOUT = 600  # secondes
+
+    # ------------------------------------------------------------------
+    # Documents
+    # ------------------------------------------------------------------
+    @staticmethod
+    def compute_document_id(file_path):
+        """Identifiant d'un document : hash SHA-256 de son contenu"""
+        return PDFProcessor.compute_hash(file_path)
+
+    @staticmethod
+    def _document_path(doc_id):
+        """
+        Emplacement d'un PDF : nommé par son contenu
+
+        Deux PDF de même nom (conversations différentes) ne s'écrasent pas, et
+        un même contenu n'est stocké qu'une fois.
+        """
+        return os.path.join(Config.UPLOAD_DIR, f"{doc_id}.pdf")
+
+    @staticmethod
+    def _receive_upload(filename, stream):
+        """
+        Reçoit un PDF uploadé par blocs dans Config.PARTIAL_UPLOAD_DIR
+
+        Le contenu n'est jamais chargé en entier en mémoire : il est haché
+        pendant l'écriture et rejeté dès qu'il dépasse Config.MAX_FILE_SIZE.
+        Le fichier reçu n'est déplacé dans Config.UPLOAD_DIR que par
+        _attach_document, sous le verrou des conversations.
+
+        Args:
+            filename (str): Nom d'origine du fichier
+            stream: Objet fichier binaire (UploadedFile, SpooledTemporaryFile...)
+
+        Returns:
+            tuple: Métadonnées du document (id, name, size, uploaded_at, file_path)
+            et chemin du fichier reçu
+
+        Raises:
+            ValueError: Fichier trop volumineux
+        """
+        name = os.path.basename(filename)
+        os.makedirs(Config.PARTIAL_UPLOAD_DIR, exist_ok=True)
+        fd, part_path = tempfile.mkstemp(suffix=".part", dir=Config.PARTIAL_UPLOAD_DIR)
+        os.close(fd)
+
+        writer = UploadWriter(part_path, Config.MAX_FILE_SIZE)
+        try:
+            for chunk in iter(lambda: stream.read(Config.UPLOAD_CHUNK_SIZE), b""):
+                writer.write(chunk)
+        except Exception:
+            writer.close()
+            os.remove(part_path)
+            raise
+        writer.close()
+
+        doc = {
+            "id": writer.digest.hexdigest(),
+            "name": name,
+            "size": writer.written,
+            "uploaded_at": datetime.now().isoformat(),
+            "file_path": AssistantService._document_path(writer.digest.hexdigest())
+        }
+        return doc, part_path
+
+    # ------------------------------------------------------------------
+    # Uploads reprenables (envoi par morceaux via l'API)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _upload_paths(upload_id):
+        base = os.path.join(Config.PARTIAL_UPLOAD_DIR, os.path.basename(upload_id))
+        return f"{base}.json", f"{base}.part"
+
+    @staticmethod
+    def start_upload(conv_id, filename, size):
+        """
+        Ouvre une session d'upload reprenable
+
+        Raises:
+            KeyError: Conversation inconnue
+            ValueError: Taille annoncée supérieure à Config.MAX_FILE_SIZE
+        """
+        AssistantService.get_conversation(conv_id)
+        if size > Config.MAX_FILE_SIZE:
+            raise ValueError(f"Fichier trop volumineux (limite : {Config.MAX_FILE_SIZE // 1_000_000} Mo)")
+
+        AssistantService.cleanup_uploads()
+        upload_id = str(uuid.uuid4())
+        os.makedirs(Config.PARTIAL_UPLOAD_DIR, exist_ok=True)
+        meta_path, part_path = AssistantService._upload_paths(upload_id)
+        with open(meta_path, "w") as f:
+            json.dump({"conversation_id": conv_id, "filename": os.path.basename(filename), "size": size}, f)
+        open(part_path, "wb").close()
+        return AssistantService.get_upload(upload_id)
+
+    @staticmethod
+    def cleanup_uploads(max_age=None):
+        """
+        Supprime les uploads abandonnés de Config.PARTIAL_UPLOAD_DIR
+
+        Une session reprenable (.json et .part), comme un fichier reçu en une
+        fois (.part seul), expire quand elle n'a reçu aucun octet depuis
+        Config.UPLOAD_SESSION_TTL secondes.
+        """
+        max_age = Config.UPLOAD_SESSION_TTL if max_age is None else max_age
+        if not os.path.isdir(Config.PARTIAL_UPLOAD_DIR):
+            return
+
+        last_activity = {}
+        for filename in os.listdir(Config.PARTIAL_UPLOAD_DIR):
+            stem = os.path.splitext(filename)[0]
+            try:
+                modified = os.path.getmtime(os.path.join(Config.PARTIAL_UPLOAD_DIR, filename))
+            except FileNotFoundError:
+                continue  # Upload terminé entre-temps
+            last_activity[stem] = max(last_activity.get(stem, 0), modified)
+
+        expired_before = time.time() - max_age
+        for stem, modified in last_activity.items():
+            if modified >= expired_before:
+                continue
+            for suffix in (".json", ".part"):
+                try:
+                    os.remove(os.path.join(Config.PARTIAL_UPLOAD_DIR, stem + suffix))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def get_upload(upload_id):
+        """État d'une session d'upload : taille annoncée et octets déjà reçus"""
+        meta_path, part_path = AssistantService._upload_paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise KeyError(f"Upload {upload_id} introuvable")
+        return {"id": upload_id, **meta, "offset": os.path.getsize(part_path)}
+
+    @staticmethod
+    def open_upload(upload_id, offset):
+        """
+        Prépare l'écriture d'un morceau à la position donnée
+
+        Raises:
+            ValueError: La position ne correspond pas aux octets déjà reçus
+        """
+        upload = AssistantService.get_upload(upload_id)
+        if offset != upload["offset"]:
+            raise ValueError(f"Position attendue : {upload['offset']}")
+        _, part_path = AssistantService._upload_paths(upload_id)
+        return UploadWriter(part_path, upload["size"], mode="ab")
+
+    @staticmethod
+    def complete_upload(upload_id):
+        """Finalise un upload complet et attache le document à sa conversation"""
+        upload = AssistantService.get_upload(upload_id)
+        if upload["offset"] != upload["size"]:
+            raise ValueError(f"Upload incomplet : {upload['offset']}/{upload['size']} octets")
+
+        meta_path, part_path = AssistantService._upload_paths(upload_id)
+        # Le hash ne peut pas être conservé entre deux requêtes : relecture séquentielle
+        doc_id = AssistantService.compute_document_id(part_path)
+        doc = {
+            "id": doc_id,
+            "name": upload["filename"],
+            "size": upload["size"],
+            "uploaded_at": datetime.now().isoformat(),
+            "file_path": AssistantService._document_path(doc_id)
+        }
+        AssistantService._attach_document(upload["conversation_id"], doc, part_path)
+        os.remove(meta_path)
+        return doc
+
+    @staticmethod
+    def _index_path(doc_id):
+        return ArtifactCache.path("embeddings", ArtifactCache.embeddings_key(doc_id))
+
+    @staticmethod
+    def _status_path(doc_id):
+        return os.path.join(Config.INDEX_DIR, f"{doc_id}.json")
+
+    @staticmethod
+    def _write_status(doc_id, status, **extra):
+        os.makedirs(Config.INDEX_DIR, exist_ok=True)
+        payload = {
+            "id": doc_id,
+            "status": status,
+            "index_key": ArtifactCache.embeddings_key(doc_id),
+            "updated_at": datetime.now().isoformat(),
+            **extra
+        }
+        tmp_path = AssistantService._status_path(doc_id) + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, AssistantService._status_path(doc_id))
+        return payload
+
+    @staticmethod
+    def get_status(doc_id):
+        """Retourne l'état d'ingestion d'un document (pending, processing, ready, failed)"""
+        index_key = ArtifactCache.embeddings_key(doc_id)
+        try:
+            with open(AssistantService._status_path(doc_id)) as f:
+                status = json.load(f)
+        except FileNotFoundError:
+            status = {"id": doc_id, "status": "pending"}
+
+        if status.get("index_key") != index_key:
+            # Paramètres d'ingestion modifiés : seules les étapes concernées seront refaites
+            ready = index_key is not None and os.path.isdir(AssistantService._index_path(doc_id))
+            status = {"id": doc_id, "status": "ready" if ready else "pending"}
+        return status
+
+    @staticmethod
+    def _claim(doc_id):
+        """Réserve l'ingestion d'un document pour ce processus"""
+        os.makedirs(Config.INDEX_DIR, exist_ok=True)
+        lock_path = os.path.join(Config.INDEX_DIR, f"{doc_id}.lock")
+        try:
+            if time.time() - os.path.getmtime(lock_path) > AssistantService.INGEST_LOCK_TIMEOUT:
+                # Ingestion interrompue par un worker arrêté
+                os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return lock_path
+        except FileExistsError:
+            return None
+
+    @staticmethod
+    def ingest(doc_id, file_path, session_id=None):
+        """
+        Indexe un document et persiste ses artefacts (texte, passages, index FAISS)
+
+        L'opération est idempotente : un document déjà indexé (même contenu)
+        n'est pas retraité, et un seul worker traite un document donné.
+
+        Returns:
+            dict: État d'ingestion du document
+        """
+        status = AssistantService.get_status(doc_id)
+        if status["status"] == "ready":
+            return status
+
+        lock_path = AssistantService._claim(doc_id)
+        if lock_path is None:
+            return {"id": doc_id, "status": "processing"}
+
+        try:
+            AssistantService._write_status(doc_id, "processing")
+            PDFProcessor.build_index(file_path, doc_id, session_id)
+        except Exception as e:
+            os.remove(lock_path)
+            return AssistantService._write_status(doc_id, "failed", error=str(e))
+
+        # L'index FAISS suffit à interroger le document
+        AssistantService._write_status(doc_id, "ready")
+        try:
+            return AssistantService._complete_ingest(doc_id)
+        finally:
+            os.remove(lock_path)
+
+    @staticmethod
+    def _complete_ingest(doc_id):
+        """
+        Étapes complémentaires d'un document indexé : profil de routage et
+        recherche globale
+
+        Un échec (base de recherche verrouillée, par exemple) laisse le
+        document prêt ; les étapes manquées sont notées dans son état et
+        relancées par ensure_document.
+        """
+        incomplete = []
+        for step in (DocumentRouter.profile, GlobalSearch.index_document):
+            try:
+                step(doc_id)
+            except Exception as e:
+                incomplete.append(f"{step.__qualname__} : {e}")
+        return AssistantService._write_status(doc_id, "ready", **({"incomplete": incomplete} if incomplete else {}))
+
+    @staticmethod
+    def ensure_document(doc):
+        """
+        Garantit qu'un document est indexé et retourne son identifiant
+
+        Les documents enregistrés avant l'introduction des identifiants sont
+        hashés à la volée.
+
+        Returns:
+            str: Identifiant du document, None si le fichier est introuvable
+        """
+        file_path = ConversationStorage.document_file(doc)
+        doc_id = doc.get("id")
+        if not doc_id:
+            if not os.path.exists(file_path):
+                return None
+            doc_id = AssistantService.compute_document_id(file_path)
+            doc["id"] = doc_id
+
+        status = AssistantService.get_status(doc_id)
+        # Échec ancien (OCR ou API momentanément indisponibles) : nouvel essai
+        retry = status["status"] == "failed" and (
+            datetime.now() - datetime.fromisoformat(status["updated_at"])
+        ).total_seconds() > Config.INGEST_RETRY_DELAY
+        if (status["status"] not in ("ready", "failed") or retry) and os.path.exists(file_path):
+            AssistantService.ingest(doc_id, file_path)
+        elif status.get("incomplete"):
+            AssistantService._complete_ingest(doc_id)
+        return doc_id
+
+    @staticmethod
+    def load_index(doc_id):
+        """Charge depuis le disque l'index FAISS d'un document déjà indexé"""
+        return PDFProcessor.load_index(AssistantService._index_path(doc_id))
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _load_merged(index_paths):
+        vector_store = None
+        for index_path in index_paths:
+            index = PDFProcessor.load_index(index_path)
+            if vector_store:
+                vector_store.merge_from(index)
+            else:
+                vector_store = index
+        return vector_store
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _routed(doc_ids):
+        # Profils et index par document chargés une fois par processus
+        return RoutedStore(doc_ids)
+
+    @staticmethod
+    def load_vector_store(doc_ids):
+        """
+        Charge et fusionne les index persistés des documents prêts
+
+        Le résultat est mis en cache par processus (les index sont immuables,
+        identifiés par leur contenu) : il ne doit pas être modifié en place.
+        Au-delà de Config.ROUTING_MIN_DOCUMENTS documents, les index ne sont
+        pas fusionnés : les questions sont routées vers les plus pertinents.
+
+        Returns:
+            FAISS | RoutedStore: Vector store, None si aucun document n'est prêt
+        """
+        ready = tuple(sorted({
+            doc_id for doc_id in doc_ids
+            if doc_id and AssistantService.get_status(doc_id)["status"] == "ready"
+        }))
+        if not ready:
+            return None
+        if len(ready) > Config.ROUTING_MIN_DOCUMENTS:
+            return AssistantService._routed(ready)
+        # Clé de cache : dossiers d'index, qui changent avec les paramètres d'ingestion
+        return AssistantService._load_merged(tuple(AssistantService._index_path(doc_id) for doc_id in ready))
+
+    # ------------------------------------------------------------------
+    # Conversations
+    # ------------------------------------------------------------------
+    @staticmethod
+    def list_conversations():
+        """Liste les conversations (sans les messages)"""
+        return [
+            {
+                "id": conv_id,
+                "title": conv["title"],
+                "messages": len(conv["messages"]),
+                "documents": len(conv.get("documents", []))
+            }
+            for conv_id, conv in ConversationStorage.read_all().items()
+        ]
+
+    @staticmethod
+    def create_conversation(title=None):
+        """Crée une conversation vide et retourne son identifiant"""
+        conv_id = str(uuid.uuid4())
+
+        def mutate(conversations):
+            conversations[conv_id] = {
+                "id": conv_id,
+                "title": title or f"Conversation {len(conversations)}",
+                "messages": [],
+                "documents": []
+            }
+            return conversations[conv_id]
+
+        return conv_id, ConversationStorage.update(mutate)
+
+    @staticmethod
+    def get_conversation(conv_id):
+        """Retourne une conversation persistée, lève KeyError si elle n'existe pas"""
+        conversations = ConversationStorage.read_all()
+        if conv_id not in conversations:
+            raise KeyError(f"Conversation {conv_id} introuvable")
+        return conversations[conv_id]
+
+    @staticmethod
+    def rename_conversation(conv_id, title):
+        """Renomme une conversation persistée"""
+        def mutate(conversations):
+            if conv_id not in conversations:
+                raise KeyError(f"Conversation {conv_id} introuvable")
+            conversations[conv_id]["title"] = title
+
+        ConversationStorage.update(mutate)
+
+    @staticmethod
+    def delete_conversation(conv_id):
+        """
+        Supprime une conversation et ses entrées de recherche
+
+        Les PDF ne sont pas supprimés ici : ils peuvent être partagés avec
+        d'autres conversations, ConversationStorage.cleanup_old_files retire
+        ceux qui ne sont plus référencés.
+        """
+        def mutate(conversations):
+            conversations.pop(conv_id, None)
+
+        ConversationStorage.update(mutate)
+        GlobalSearch.remove_conversation(conv_id)
+
+    @staticmethod
+    def _attach_document(conv_id, doc, part_path=None):
+        """
+        Attache un document à une conversation
+
+        Un fichier reçu (part_path) est déplacé vers doc["file_path"] sous le
+        verrou des conversations : cleanup_old_files ne le voit jamais sans
+        la référence qui le protège.
+        """
+        def mutate(conversations):
+            if conv_id not in conversations:
+                raise KeyError(f"Conversation {conv_id} introuvable")
+            if part_path:
+                os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
+                os.replace(part_path, doc["file_path"])
+            documents = conversations[conv_id].setdefault("documents", [])
+            if not any(d.get("id") == doc["id"] for d in documents):
+                documents.append(doc)
+
+        ConversationStorage.update(mutate)
+        GlobalSearch.link_document(conv_id, doc)
+
+    @staticmethod
+    def detach_document(conv_id, doc_id):
+        """Retire un document d'une conversation (le fichier est nettoyé s'il n'est plus référencé)"""
+        def mutate(conversations):
+            if conv_id in conversations:
+                conversations[conv_id]["documents"] = [
+                    doc for doc in conversations[conv_id].get("documents", []) if doc.get("id") != doc_id
+                ]
+
+        ConversationStorage.update(mutate)
+        GlobalSearch.unlink_document(conv_id, doc_id)
+
+    @staticmethod
+    def add_document(conv_id, filename, stream):
+        """Enregistre un PDF et l'attache à une conversation (sans l'indexer)"""
+        AssistantService.get_conversation(conv_id)
+        doc, part_path = AssistantService._receive_upload(filename, stream)
+        try:
+            AssistantService._attach_document(conv_id, doc, part_path)
+        finally:
+            # Conversation supprimée entre-temps : le fichier reçu n'est pas conservé
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return doc
+
+    @staticmethod
+    def append_message(conv_id, role, content):
+        """Ajoute un message à une conversation persistée"""
+        message = Message.now(role, content).to_dict()
+
+        def mutate(conversations):
+            if conv_id not in conversations:
+                raise KeyError(f"Conversation {conv_id} introuvable")
+            conversations[conv_id]["messages"].append(message)
+
+        ConversationStorage.update(mutate)
+        GlobalSearch.index_message(conv_id, message)
+        return message
+
+    @staticmethod
+    def _record_document_ids(conv_id, documents):
+        """Enregistre les identifiants calculés pour les documents d'avant les identifiants"""
+        doc_ids = {(doc["name"], doc.get("uploaded_at")): doc["id"] for doc in documents if doc.get("id")}
+
+        def mutate(conversations):
+            recorded = []
+            for doc in conversations.get(conv_id, {}).get("documents", []):
+                doc_id = doc_ids.get((doc["name"], doc.get("uploaded_at")))
+                if not doc.get("id") and doc_id:
+                    doc["id"] = doc_id
+                    recorded.append(doc)
+            return recorded
+
+        for doc in ConversationStorage.update(mutate):
+            GlobalSearch.link_document(conv_id, doc)
+
+    @staticmethod
+    def documents_vector_store(documents, conv_id=None):
+        """
+        Vector store d'une liste de documents (métadonnées de conversation)
+
+        Les identifiants calculés pour les documents anciens sont persistés
+        dans la conversation conv_id : ils ne sont hashés qu'une fois.
+        """
+        legacy = any(not doc.get("id") for doc in documents)
+        doc_ids = [AssistantService.ensure_document(doc) for doc in documents]
+        if legacy and conv_id:
+            AssistantService._record_document_ids(conv_id, documents)
+        return AssistantService.load_vector_store(doc_ids)
+
+    @staticmethod
+    def get_vector_store(conv_id):
+        """Vector store de l'ensemble des documents prêts d'une conversation"""
+        conv = AssistantService.get_conversation(conv_id)
+        return AssistantService.documents_vector_store(conv.get("documents", []), conv_id)
+
+    @staticmethod
+    def ask(conv_id, question):
+        """Pose une question dans une conversation et persiste l'échange"""
+        AssistantService.append_message(conv_id, "user", question)
+        vector_store = AssistantService.get_vector_store(conv_id)
+        if vector_store:
+            answer = ChatManager.generate_response(question, vector_store, session_id=conv_id)
+        else:
+            answer = "Aucun document valide n'a pu être chargé. Veuillez vérifier vos fichiers PDF."
+        return AssistantService.append_message(conv_id, "ai", answer)
+
+    @staticmethod
+    def search(query, limit=20):
+        """Recherche globale dans tous les documents et toutes les conversations"""
+        return GlobalSearch.search(query, limit)
@@ -1,95 +1,148 @@
 import json
 import os
-from datetime import datetime
+import time
+from contextlib import contextmanager
 import streamlit as st
+from utils.config import Config
+from utils.models import Message
 
 class ConversationStorage:
+    LOCK_TIMEOUT = 10  # secondes
+
     @staticmethod
-    def save_conversations():
-        """Sauvegarde les conversations et gère les fichiers PDF"""
-        if 'conversations' not in st.session_state:
-            return
+    @contextmanager
+    def _locked():
+        """
+        Verrou inter-processus sur le fichier de conversations
+
+        Plusieurs workers de l'API et l'interface Streamlit écrivent dans le
+        même fichier : le verrou est un fichier créé de manière exclusive,
+        portable sous Windows comme sous Linux.
+        """
+        lock_path = Config.CONVERSATIONS_FILE + ".lock"
+        deadline = time.monotonic() + ConversationStorage.LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    # Verrou abandonné par un processus interrompu
+                    try:
+                        os.remove(lock_path)
+                    except FileNotFoundError:
+                        pass
+                    deadline = time.monotonic() + ConversationStorage.LOCK_TIMEOUT
+                    continue
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+    @staticmethod
+    def read_all():
+        """Lit le fichier de conversations tel quel (sans conversion)"""
+        if not os.path.exists(Config.CONVERSATIONS_FILE):
+            return {}
+        with open(Config.CONVERSATIONS_FILE, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_all(conversations):
+        """Écrit le fichier de conversations de manière atomique"""
+        tmp_path = Config.CONVERSATIONS_FILE + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(conversations, f, default=str)
+        os.replace(tmp_path, Config.CONVERSATIONS_FILE)
+
+    @staticmethod
+    def update(mutate):
+        """
+        Lecture-modification-écriture protégée par le verrou
 
-        # Créer le dossier temporaire s'il n'existe pas
-        os.makedirs("temp_pdfs", exist_ok=True)
-
-        # Préparer les données à sauvegarder
-        conversations_to_save = {}
-        
-        for conv_id, conv in st.session_state.conversations.items():
-            # Créer une copie sérialisable sans le vector_store
-            conv_copy = {
-                "id": conv["id"],
-                "title": conv["title"],
-                "messages": conv["messages"],
-                "documents": []
-            }
-
-            # Sauvegarder les métadonnées des documents
-            for doc in conv.get("documents", []):
-                doc_copy = {
-                    "name": doc["name"],
-                    "size": doc["size"],
-                    "uploaded_at": doc["uploaded_at"],
-                    "file_path": doc.get("file_path", "")
-                }
-                conv_copy["documents"].append(doc_copy)
-
-            conversations_to_save[conv_id] = conv_copy
-
-        # Sauvegarder dans le fichier JSON
-        with open('conversations.json', 'w') as f:
-            json.dump(conversations_to_save, f, default=str)
+        Args:
+            mutate (callable): Reçoit le dictionnaire des conversations et le modifie sur place
+
+        Returns:
+            La valeur retournée par mutate
+        """
+        with ConversationStorage._locked():
+            conversations = ConversationStorage.read_all()
+            result = mutate(conversations)
+            ConversationStorage.write_all(conversations)
+            return result
+
+    @staticmethod
+    def modified_at():
+        """Date de dernière modification du fichier de conversations (None s'il n'existe pas)"""
+        try:
+            return os.stat(Config.CONVERSATIONS_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
 
     @staticmethod
     def load_conversations():
         """Charge les conversations et prépare la reconstruction des vector stores"""
-        if not os.path.exists('conversations.json'):
+        if not os.path.exists(Config.CONVERSATIONS_FILE):
             return None
 
-        with open('conversations.json', 'r') as f:
-            conversations = json.load(f)
-            
-            # Convertir les dates et préparer les vector stores
-            for conv in conversations.values():
-                # Conversion des timestamps
-                for msg in conv['messages']:
-                    if isinstance(msg['timestamp'], str):
-                        try:
-                            msg['timestamp'] = datetime.fromisoformat(msg['timestamp'])
-                        except ValueError:
-                            msg['timestamp'] = datetime.now()
-                
-                # Initialiser le vector_store pour reconstruction ultérieure
-                conv['vector_store'] = None
-                
-                # Vérifier les chemins des fichiers PDF
-                for doc in conv.get('documents', []):
-                    if 'file_path' not in doc:
-                        doc['file_path'] = os.path.join("temp_pdfs", doc["name"])
+        conversations = ConversationStorage.read_all()
+
+        # Représentation compacte des messages et préparation des vector stores
+        for conv in conversations.values():
+            conv['messages'] = Message.from_dicts(conv['messages'])
+
+            # Initialiser le vector_store pour reconstruction ultérieure
+            conv['vector_store'] = None
+
+            # Vérifier les chemins des fichiers PDF
+            for doc in conv.get('documents', []):
+                if 'file_path' not in doc:
+                    doc['file_path'] = os.path.join(Config.UPLOAD_DIR, doc["name"])
 
-            return conversations
+        return conversations
+
+    @staticmethod
+    def document_file(doc):
+        """
+        Chemin du PDF d'un document
+
+        Les conversations enregistrées sous Windows contiennent des chemins
+        relatifs comme temp_pdfs\\nom.pdf, introuvables ailleurs : le fichier
+        est alors cherché sous son nom dans Config.UPLOAD_DIR.
+        """
+        file_path = doc.get('file_path')
+        if file_path and os.path.exists(file_path):
+            return file_path
+        return os.path.join(Config.UPLOAD_DIR, doc['name'])
 
     @staticmethod
     def cleanup_old_files():
-        """Nettoie les fichiers PDF orphelins"""
-        if not os.path.exists('conversations.json') or not os.path.exists('temp_pdfs'):
+        """
+        Nettoie les fichiers PDF orphelins
+
+        Les uploads en cours sont écrits dans Config.PARTIAL_UPLOAD_DIR et
+        n'arrivent dans Config.UPLOAD_DIR qu'en même temps que leur référence,
+        sous le même verrou : un fichier non référencé ici est bien orphelin.
+        """
+        if not os.path.exists(Config.CONVERSATIONS_FILE) or not os.path.exists(Config.UPLOAD_DIR):
             return
 
-        # Récupérer tous les fichiers PDF référencés
-        referenced_files = set()
-        with open('conversations.json', 'r') as f:
-            conversations = json.load(f)
+        with ConversationStorage._locked():
+            # Récupérer tous les fichiers PDF référencés
+            referenced_files = set()
+            conversations = ConversationStorage.read_all()
             for conv in conversations.values():
                 for doc in conv.get('documents', []):
-                    if 'file_path' in doc:
-                        referenced_files.add(doc['file_path'])
-
-        # Supprimer les fichiers non référencés
-        for filename in os.listdir('temp_pdfs'):
-            filepath = os.path.join('temp_pdfs', filename)
-            if filepath not in referenced_files and os.path.isfile(filepath):
-                try:
-                    os.remove(filepath)
-                except Exception as e:
-                    st.error(f"Erreur lors de la suppression de {filename}: {str(e)}")
\ No newline at end of file
+                    referenced_files.add(os.path.normpath(ConversationStorage.document_file(doc)))
+
+            # Supprimer les fichiers non référencés
+            for filename in os.listdir(Config.UPLOAD_DIR):
+                filepath = os.path.join(Config.UPLOAD_DIR, filename)
+                if os.path.normpath(filepath) not in referenced_files and os.path.isfile(filepath):
+                    try:
+                        os.remove(filepath)
+                    except Exception as e:
+                        st.error(f"Erreur lors de la suppression de {filename}: {str(e)}")
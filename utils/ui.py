@@ -1,10 +1,10 @@
 import streamlit as st
 import uuid
 import os
-from datetime import datetime
 from utils.config import Config
 from utils.storage import ConversationStorage
-from utils.pdf_processor import PDFProcessor
+from utils.service import AssistantService
+from utils.global_search import GlobalSearch
 
 class UI:
     @staticmethod
@@ -20,46 +20,54 @@ class UI:
         with open("assets/styles.css") as f:
             st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+    @staticmethod
+    def _document_ids(conv):
+        return [doc.get("id") for doc in conv.get("documents", [])]
+
     @staticmethod
     def init_session_state():
-        """Initialise l'état de session avec chargement des conversations sauvegardées"""
-        if "conversations" not in st.session_state:
-            saved_conversations = ConversationStorage.load_conversations()
-            
-            if saved_conversations:
-                st.session_state.conversations = saved_conversations
-                # Reconstruire les vector stores à partir des PDFs sauvegardés
-                for conv in st.session_state.conversations.values():
-                    if conv["documents"]:
-                        conv["vector_store"] = None
-                        for doc in conv["documents"]:
-                            file_path = os.path.join("temp_pdfs", doc["name"])
-                            if os.path.exists(file_path):
-                                try:
-                                    vector_store = PDFProcessor.process_pdf(file_path)
-                                    if vector_store:
-                                        if conv["vector_store"]:
-                                            conv["vector_store"].merge_from(vector_store)
-                                        else:
-                                            conv["vector_store"] = vector_store
-                                except Exception as e:
-                                    st.error(f"Erreur lors du rechargement de {doc['name']}: {str(e)}")
-            else:
-                st.session_state.conversations = {
-                    "default": {
-                        "id": str(uuid.uuid4()),
-                        "title": Config.DEFAULT_CONVERSATION_NAME,
-                        "messages": [],
-                        "documents": [],
-                        "vector_store": None
-                    }
-                }
-
-        if "current_conversation" not in st.session_state:
-            st.session_state.current_conversation = "default"
+        """
+        Synchronise l'état de session avec les conversations sauvegardées
+
+        Le fichier de conversations est partagé avec l'API et les autres
+        sessions : il est relu dès qu'il a changé, et toute modification
+        passe par AssistantService. Un vector store déjà chargé est conservé
+        tant que les documents de sa conversation n'ont pas changé.
+        """
+        first_load = "conversations" not in st.session_state
+        modified_at = ConversationStorage.modified_at()
+        if first_load or st.session_state.conversations_modified_at != modified_at:
+            conversations = ConversationStorage.load_conversations()
+            if not conversations:
+                AssistantService.create_conversation(Config.DEFAULT_CONVERSATION_NAME)
+                modified_at = ConversationStorage.modified_at()
+                conversations = ConversationStorage.load_conversations()
+
+            previous = st.session_state.get("conversations", {})
+            for conv_id, conv in conversations.items():
+                old = previous.get(conv_id)
+                if old and UI._document_ids(old) == UI._document_ids(conv):
+                    conv["vector_store"] = old.get("vector_store")
+                elif first_load and conv["documents"]:
+                    # Les index déjà calculés sont rechargés depuis le disque
+                    try:
+                        conv["vector_store"] = AssistantService.documents_vector_store(conv["documents"], conv_id)
+                    except Exception as e:
+                        st.error(f"Erreur lors du rechargement de {conv['title']}: {str(e)}")
+
+            st.session_state.conversations = conversations
+            st.session_state.conversations_modified_at = modified_at
+
+        # Conversation courante supprimée (ici ou par un autre client)
+        if st.session_state.get("current_conversation") not in st.session_state.conversations:
+            st.session_state.current_conversation = next(iter(st.session_state.conversations))
+
+        # Identifiant de session pour le partage équitable des appels OpenAI
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = str(uuid.uuid4())
 
         # Créer le dossier temp_pdfs s'il n'existe pas
-        os.makedirs("temp_pdfs", exist_ok=True)
+        os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
 
 
     @staticmethod
@@ -69,17 +77,8 @@ class UI:
             st.title("📚 Conversations")
             
             if st.button("➕ Nouvelle conversation", use_container_width=True, key="new_chat"):
-                conv_id = str(uuid.uuid4())
-                conv_title = f"Conversation {len(st.session_state.conversations)}"
-                st.session_state.conversations[conv_id] = {
-                    "id": conv_id,
-                    "title": conv_title,
-                    "messages": [],
-                    "documents": [],
-                    "vector_store": None
-                }
+                conv_id, _ = AssistantService.create_conversation()
                 st.session_state.current_conversation = conv_id
-                ConversationStorage.save_conversations()
                 st.rerun()
             
             st.divider()
@@ -106,19 +105,12 @@ class UI:
                         type="secondary"
                     ):
                         if len(st.session_state.conversations) > 1:
-                            # Supprimer les fichiers PDF associés
-                            for doc in conv["documents"]:
-                                file_path = os.path.join("temp_pdfs", doc["name"])
-                                if os.path.exists(file_path):
-                                    try:
-                                        os.remove(file_path)
-                                    except Exception as e:
-                                        st.error(f"Erreur suppression {doc['name']}: {str(e)}")
-                            
-                            del st.session_state.conversations[conv_id]
+                            # Les PDF non référencés sont retirés par cleanup_old_files
+                            AssistantService.delete_conversation(conv_id)
                             if st.session_state.current_conversation == conv_id:
-                                st.session_state.current_conversation = next(iter(st.session_state.conversations))
-                            ConversationStorage.save_conversations()
+                                st.session_state.current_conversation = next(
+                                    other for other in st.session_state.conversations if other != conv_id
+                                )
                             st.rerun()
                         else:
                             st.warning("Vous ne pouvez pas supprimer la dernière conversation")
@@ -132,8 +124,39 @@ class UI:
                 key="file_uploader"
             )
             
+            st.divider()
+            st.title("🔎 Recherche")
+            query = st.text_input("Tous les documents et conversations", key="global_search")
+            if query:
+                UI.render_search_results(query)
+            
             return uploaded_files
 
+    @staticmethod
+    def render_search_results(query):
+        """Affiche les résultats de la recherche globale avec leurs références"""
+        conversations = st.session_state.conversations
+        hits = GlobalSearch.search(query, limit=10)
+        if not hits:
+            st.caption("Aucun résultat")
+            return
+        
+        for hit in hits:
+            if hit["kind"] == "message":
+                conv = conversations.get(hit["conversation_id"])
+                title = conv["title"] if conv else "Conversation supprimée"
+                st.markdown(f"💬 **{title}**  \n{hit['snippet']}")
+            else:
+                names = {ref["name"] for ref in hit["references"]} or {hit["document_id"][:12]}
+                titles = [
+                    conversations[ref["conversation_id"]]["title"]
+                    for ref in hit["references"]
+                    if ref["conversation_id"] in conversations
+                ]
+                st.markdown(f"📄 **{', '.join(sorted(names))}** (p. {hit['page']})  \n{hit['snippet']}")
+                if titles:
+                    st.caption(" · ".join(titles))
+
     @staticmethod
     def render_chat():
         """Affiche la zone de chat principale avec historique persisté"""
@@ -147,8 +170,7 @@ class UI:
             if st.button("✏️ Renommer"):
                 new_title = st.text_input("Nouveau nom", value=current_conv["title"])
                 if new_title and new_title != current_conv["title"]:
-                    current_conv["title"] = new_title
-                    ConversationStorage.save_conversations()
+                    AssistantService.rename_conversation(st.session_state.current_conversation, new_title)
                     st.rerun()
 
         st.caption(f"📝 {len(current_conv['messages'])} messages | 📄 {len(current_conv['documents'])} documents")
@@ -158,20 +180,10 @@ class UI:
         with chat_container:
             for msg in current_conv["messages"]:
                 with st.container():
-                    role_class = "user-message" if msg["role"] == "user" else "ai-message"
-                    role_name = "Vous" if msg["role"] == "user" else "Assistant"
-                    role_color = "#4d90fe" if msg["role"] == "user" else "#34a853"
-                    
-                    # Gestion robuste du timestamp
-                    try:
-                        if isinstance(msg["timestamp"], datetime):
-                            timestamp = msg["timestamp"].strftime("%H:%M")
-                        elif isinstance(msg["timestamp"], str):
-                            timestamp = datetime.fromisoformat(msg["timestamp"]).strftime("%H:%M")
-                        else:
-                            timestamp = datetime.now().strftime("%H:%M")
-                    except (ValueError, TypeError, AttributeError):
-                        timestamp = datetime.now().strftime("%H:%M")
+                    role_class = "user-message" if msg.role == "user" else "ai-message"
+                    role_name = "Vous" if msg.role == "user" else "Assistant"
+                    role_color = "#4d90fe" if msg.role == "user" else "#34a853"
+                    timestamp = msg.clock
                     
                     st.markdown(
                         f'<div class="message-container">'
@@ -180,7 +192,7 @@ class UI:
                         f'<strong style="color: {role_color};">{role_name}</strong>'
                         f'<small style="color: #666;">{timestamp}</small>'
                         f'</div>'
-                        f'<div style="margin-top: 8px;">{msg["content"]}</div>'
+                        f'<div style="margin-top: 8px;">{msg.content}</div>'
                         f'</div>'
                         f'</div>'
                         f'<div style="height: 16px;"></div>',